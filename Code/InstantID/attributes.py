@@ -0,0 +1,54 @@
+HDR_SUFFIX = "High dynamic range, vivid, rich details, clear shadows and highlights, realistic, intense, enhanced contrast, highly detailed"
+
+LOW_QUALITY = "(lowres, low quality, worst quality:1.2), (text:1.2), blue eyes, flat, low contrast, oversaturated, underexposed, overexposed, blurred, noisy, watermark, painting, drawing, illustration, glitch, deformed, mutated, cross-eyed, ugly, disfigured"
+
+LOW_QUALITY_FULL = "(lowres, low quality, worst quality:1.2), (text:1.2), blue eyes, flat, low contrast, oversaturated, underexposed, overexposed, blurred, noisy, watermark, painting, drawing, illustration, glitch, deformed, mutated, cross-eyed, ugly, disfigured (lowres, low quality, worst quality:1.2), (text:1.2), watermark, painting, drawing, illustration, glitch,deformed, mutated, cross-eyed, ugly, disfigured"
+
+# One entry per former infer_*.py script. `prompt` and `negative_prompt` are
+# kept exactly as each script passed them to the pipeline (the attribute
+# scripts feed the HDR attribute text as the negative prompt), so outputs
+# match the published Result_InstantID images. `{attribute}` is substituted
+# per attribute; an attribute of None means the plain reconstruction run.
+ATTRIBUTE_GROUPS = {
+    'full': {
+        'attributes': [None],
+        'prompt': f"HDR colored photo of person. {HDR_SUFFIX}",
+        'negative_prompt': LOW_QUALITY_FULL,
+    },
+    'gender': {
+        'attributes': ["female", "male"],
+        'prompt': LOW_QUALITY,
+        'negative_prompt': f"HDR colored photo of a {{attribute}}. {HDR_SUFFIX}",
+    },
+    'person': {
+        'attributes': ["angry", "bald", "old", "smiling", "young"],
+        'prompt': LOW_QUALITY,
+        'negative_prompt': f"HDR colored photo of a {{attribute}} person. {HDR_SUFFIX}",
+    },
+    'wearing': {
+        'attributes': ["eyeglasses", "hat", "necktie"],
+        'prompt': LOW_QUALITY,
+        'negative_prompt': f"HDR colored photo of person wearing {{attribute}}. {HDR_SUFFIX}",
+    },
+    'with': {
+        'attributes': ["bangs", "big lips", "big nose", "black hair", "brown hair", "blond hair", "bushy eyebrows", "disgust expression", "double chin", "fear expression", "mustache", "neutral expression", "no beard", "sad expression", "slightly open mouth"],
+        'prompt': LOW_QUALITY,
+        'negative_prompt': f"HDR colored photo of person with {{attribute}}. {HDR_SUFFIX}",
+    },
+}
+
+
+def output_name(i, attribute, ext='.jpg'):
+    if attribute is None:
+        return f'result_{i}{ext}'
+    return f'result_{i}_{attribute}{ext}'
+
+
+def iter_prompts(groups=None):
+    # Yield (attribute, prompt, negative_prompt) for every attribute of the selected groups
+    for group in groups or ATTRIBUTE_GROUPS.keys():
+        spec = ATTRIBUTE_GROUPS[group]
+        for attribute in spec['attributes']:
+            yield (attribute,
+                   spec['prompt'].format(attribute=attribute),
+                   spec['negative_prompt'].format(attribute=attribute))
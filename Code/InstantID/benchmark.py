@@ -0,0 +1,198 @@
+import argparse
+import csv
+import itertools
+import os
+import resource
+import time
+
+import numpy as np
+import torch
+
+from attributes import ATTRIBUTE_GROUPS, iter_prompts
+from diffusers.utils import load_image
+from insightface.utils import face_align
+
+from engine import InstantIDEngine
+from face_sink import iter_face_shards
+from failures import NoFaceError
+from memory_profiles import MEMORY_PROFILES
+from preprocess import convert_from_image_to_cv2
+from registry import ModelRegistry
+from result_cache import job_seed
+from schedulers import SCHEDULER_PRESETS
+
+
+def identity_similarity(engine, image, face_emb):
+    # Cosine similarity between the generated face and the source embedding
+    try:
+        embedding = engine.detect_image(image)['embedding']
+    except NoFaceError:
+        return float('nan')  # no face found in the output
+    return float(np.dot(embedding, face_emb) / (np.linalg.norm(embedding) * np.linalg.norm(face_emb)))
+
+
+def synchronize(engine):
+    if engine.device.type == 'cuda':
+        torch.cuda.synchronize(engine.device)
+
+
+def benchmark_steps(engine, image_filenames, presets=None, steps=None, groups=None, num_prompts=2, control_ends=None):
+    # Time generation for every (preset, step count, ControlNet window end) and
+    # score identity preservation of the outputs against the source faces
+    prompts = list(iter_prompts(groups))[:num_prompts]
+    conditionings = [(image_filename, engine.prepare_cached(image_filename)) for image_filename in image_filenames]
+
+    rows = []
+    for preset in presets or SCHEDULER_PRESETS.keys():
+        engine.set_scheduler(preset)
+        for num_steps, control_end in itertools.product(steps or [engine.settings['num_inference_steps']],
+                                                        control_ends or [1.0]):
+            engine.settings['num_inference_steps'] = num_steps
+            engine.set_controlnet_schedule(window=(0.0, control_end))
+
+            # Warm-up call so one-off kernel selection is not timed
+            _, conditioning = conditionings[0]
+            engine.generate(conditioning, prompts[0][1], prompts[0][2], seed=0)
+
+            latencies, similarities = [], []
+            for image_filename, conditioning in conditionings:
+                identity = os.path.splitext(os.path.basename(image_filename))[0]
+                for attribute, prompt, n_prompt in prompts:
+                    synchronize(engine)
+                    start = time.perf_counter()
+                    image = engine.generate(conditioning, prompt, n_prompt, seed=job_seed(identity, attribute))
+                    synchronize(engine)
+                    latencies.append(time.perf_counter() - start)
+                    similarities.append(identity_similarity(engine, image, conditioning['face_emb']))
+
+            rows.append({
+                'preset': preset,
+                'steps': num_steps,
+                'guidance_scale': engine.settings['guidance_scale'],
+                'control_end': control_end,
+                'latency_s': float(np.mean(latencies)),
+                'identity_similarity': float(np.nanmean(similarities)),
+                'no_face_rate': float(np.mean(np.isnan(similarities))),
+            })
+            print(f"{preset:>14} steps={num_steps:<3} control_end={control_end:.2f} latency={rows[-1]['latency_s']:.2f}s "
+                  f"similarity={rows[-1]['identity_similarity']:.3f} no_face={rows[-1]['no_face_rate']:.2f}")
+
+    engine.set_scheduler('default')
+    engine.set_controlnet_schedule()
+    return rows
+
+
+def peak_host_memory_gb():
+    # Peak resident set size of this process so far (ru_maxrss is KiB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+
+
+def benchmark_memory_profiles(image_filenames, profiles=None, groups=None, num_prompts=2, **engine_kwargs):
+    # Load the pipeline under every memory profile in turn and report peak
+    # device / host memory and throughput for the same generations. Host peak
+    # is process-wide, so profiles are best run from smallest to largest.
+    prompts = list(iter_prompts(groups))[:num_prompts]
+
+    rows = []
+    for profile in profiles or MEMORY_PROFILES.keys():
+        registry = ModelRegistry()
+        engine = InstantIDEngine(memory_profile=profile, registry=registry, **engine_kwargs)
+        conditionings = [engine.prepare_cached(image_filename) for image_filename in image_filenames]
+        engine.generate(conditionings[0], prompts[0][1], prompts[0][2], seed=0)  # load and warm up
+
+        if engine.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(engine.device)
+        synchronize(engine)
+        start = time.perf_counter()
+        images = 0
+        for conditioning in conditionings:
+            _, batch_prompts, batch_negative_prompts = zip(*prompts)
+            images += len(engine.generate_batch(conditioning, list(batch_prompts), list(batch_negative_prompts),
+                                                seeds=list(range(len(prompts)))))
+        synchronize(engine)
+        elapsed = time.perf_counter() - start
+
+        rows.append({
+            'profile': profile,
+            'device': str(engine.device),
+            'peak_device_memory_gb': (torch.cuda.max_memory_allocated(engine.device) / 2**30
+                                      if engine.device.type == 'cuda' else float('nan')),
+            'peak_host_memory_gb': peak_host_memory_gb(),
+            'images_per_s': images / elapsed,
+        })
+        print(f"{profile:>18} device={rows[-1]['peak_device_memory_gb']:.2f}GB "
+              f"host={rows[-1]['peak_host_memory_gb']:.2f}GB throughput={rows[-1]['images_per_s']:.3f} img/s")
+
+        registry.clear()
+        del engine
+    return rows
+
+
+def face_sink_drift(engine, sink_dir):
+    # How far the face sink's alignment (on the conditioning keypoints) is
+    # from aligning on keypoints detected in the output itself, in pixels of
+    # the 112x112 template, per attribute. Edits such as hats or baldness can
+    # move the generated face away from the IdentityNet keypoints.
+    drift = {}
+    for shard in iter_face_shards(sink_dir):
+        for kps, attribute, output_path in zip(shard['kps'], shard['attribute'], shard['output_path']):
+            faces = engine.app.get(convert_from_image_to_cv2(load_image(str(output_path))))
+            errors = drift.setdefault(str(attribute), [])
+            if len(faces) == 0:
+                errors.append(float('nan'))
+                continue
+            # Detection closest to the conditioning keypoints, mapped into the template
+            detected = min((face['kps'] for face in faces), key=lambda k: np.linalg.norm(k - kps, axis=1).mean())
+            M = face_align.estimate_norm(kps, 112)
+            mapped = detected @ M[:, :2].T + M[:, 2]
+            errors.append(float(np.linalg.norm(mapped - face_align.arcface_dst, axis=1).mean()))
+
+    rows = []
+    for attribute, errors in sorted(drift.items()):
+        errors = np.asarray(errors)
+        found = errors[~np.isnan(errors)]
+        rows.append({
+            'attribute': attribute,
+            'faces': len(errors),
+            'no_face': int(np.isnan(errors).sum()),
+            'mean_drift_px': float(found.mean()) if len(found) else float('nan'),
+            'p95_drift_px': float(np.percentile(found, 95)) if len(found) else float('nan'),
+        })
+        print(f"{attribute:>24} faces={rows[-1]['faces']} no_face={rows[-1]['no_face']} "
+              f"drift mean={rows[-1]['mean_drift_px']:.2f}px p95={rows[-1]['p95_drift_px']:.2f}px")
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmark InstantID sampler presets, step counts and memory profiles.')
+    parser.add_argument('--images', nargs='+', default=[f'./Images/{i}.jpg' for i in range(5)])
+    parser.add_argument('--presets', nargs='+', choices=list(SCHEDULER_PRESETS.keys()), default=None)
+    parser.add_argument('--steps', nargs='+', type=int, default=None, help='step counts to sweep for every preset')
+    parser.add_argument('--control-ends', nargs='+', type=float, default=None,
+                        help='fractions of the steps after which the ControlNets are switched off, e.g. 1.0 0.6 0.4')
+    parser.add_argument('--groups', nargs='+', choices=list(ATTRIBUTE_GROUPS.keys()), default=['person'])
+    parser.add_argument('--num-prompts', type=int, default=2)
+    parser.add_argument('--memory-profiles', nargs='*', choices=list(MEMORY_PROFILES.keys()), default=None,
+                        help='benchmark memory profiles instead of samplers (all profiles when given without names)')
+    parser.add_argument('--check-face-sink', default=None, metavar='SINK_DIR',
+                        help='compare face sink alignment against keypoints re-detected in the outputs')
+    parser.add_argument('--device', default='cuda')
+    parser.add_argument('--output', default=None, help='CSV file for the results')
+    args = parser.parse_args()
+
+    if args.check_face_sink:
+        rows = face_sink_drift(InstantIDEngine(device=args.device), args.check_face_sink)
+    elif args.memory_profiles is not None:
+        rows = benchmark_memory_profiles(args.images, args.memory_profiles, args.groups, args.num_prompts,
+                                         device=args.device)
+    else:
+        engine = InstantIDEngine(device=args.device)
+        rows = benchmark_steps(engine, args.images, args.presets, args.steps, args.groups, args.num_prompts,
+                               args.control_ends)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Bump when the preprocessing that produces the conditioning changes so stale
+# entries on disk are not reused.
+CONDITIONING_VERSION = 'v3'
+
+IMAGE_KEYS = ('face_kps', 'depth')
+ARRAY_KEYS = ('face_emb', 'kps', 'bbox', 'control_mask')
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ConditioningCache:
+    # Per-identity conditioning (face embedding, keypoint image, depth map and
+    # control mask) does not depend on the attribute prompt, so it is computed
+    # once per source image and reused for every attribute. Entries are keyed
+    # by the hash of the source image, kept in a small in-memory LRU and
+    # optionally persisted to `cache_dir` as <key>.npz plus <key>_<name>.png.
+
+    def __init__(self, cache_dir=None, max_items=8, variant=None):
+        self.cache_dir = cache_dir
+        self.variant = variant
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, image_filename, pose_filename=None):
+        key = f'{CONDITIONING_VERSION}_{file_sha1(image_filename)}'
+        if self.variant:
+            key = f'{self.variant}_{key}'
+        if pose_filename is not None:
+            key = f'{key}_{file_sha1(pose_filename)}'
+        return key
+
+    def get(self, image_filename, compute, pose_filename=None):
+        key = self.key(image_filename, pose_filename)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        conditioning = self._load(key)
+        if conditioning is None:
+            conditioning = compute(image_filename, pose_filename)
+            self._save(key, conditioning)
+
+        with self._lock:
+            self._entries[key] = conditioning
+            if len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return conditioning
+
+    def _paths(self, key):
+        arrays = os.path.join(self.cache_dir, f'{key}.npz')
+        images = {name: os.path.join(self.cache_dir, f'{key}_{name}.png') for name in IMAGE_KEYS}
+        return arrays, images
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        arrays, images = self._paths(key)
+        if not os.path.exists(arrays) or not all(os.path.exists(p) for p in images.values()):
+            return None
+
+        with np.load(arrays) as data:
+            conditioning = {name: data[name] for name in ARRAY_KEYS}
+        for name, path in images.items():
+            with Image.open(path) as img:
+                conditioning[name] = img.copy()
+        return conditioning
+
+    def _save(self, key, conditioning):
+        if self.cache_dir is None:
+            return
+        arrays, images = self._paths(key)
+
+        # Write the images first; the .npz marks a complete entry
+        for name, path in images.items():
+            conditioning[name].save(path)
+        with open(arrays + '.tmp', 'wb') as f:
+            np.savez_compressed(f, **{name: np.asarray(conditioning[name]) for name in ARRAY_KEYS})
+        os.replace(arrays + '.tmp', arrays)
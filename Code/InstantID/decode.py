@@ -0,0 +1,57 @@
+import torch
+
+# Generation output modes and the file extension each one is saved with.
+# 'latent' skips VAE decoding and saves the raw SDXL latents; 'face' decodes
+# only the latents around the face bbox and saves that crop.
+OUTPUT_MODES = {
+    'image': '.jpg',
+    'latent': '.npy',
+    'face': '.jpg',
+}
+
+
+def decode_latents(pipe, latents):
+    # VAE decode as done at the end of the SDXL pipeline, including the fp32
+    # upcast the SDXL VAE needs to avoid overflowing in fp16
+    vae = pipe.vae
+    needs_upcasting = vae.dtype == torch.float16 and vae.config.force_upcast
+    if needs_upcasting:
+        pipe.upcast_vae()
+        latents = latents.to(next(iter(vae.post_quant_conv.parameters())).dtype)
+    else:
+        latents = latents.to(vae.dtype)
+
+    image = vae.decode(latents / vae.config.scaling_factor, return_dict=False)[0]
+
+    if needs_upcasting:
+        vae.to(dtype=torch.float16)
+    return pipe.image_processor.postprocess(image, output_type='pil')
+
+
+def face_latent_box(bbox, size, scale_factor=8, margin=0.25, context=4):
+    # Latent box covering the face bbox (pixels of an image of `size`) grown by
+    # `margin` of the face size, plus `context` latent pixels so the decoder
+    # sees the surroundings. Returns the latent box and the face crop within
+    # the decoded region, both as (left, top, right, bottom).
+    width, height = size
+    x0, y0, x1, y1 = bbox
+    mx, my = (x1 - x0) * margin, (y1 - y0) * margin
+    left, top = max(0, int(x0 - mx)), max(0, int(y0 - my))
+    right, bottom = min(width, int(x1 + mx + 0.5)), min(height, int(y1 + my + 0.5))
+
+    latent_box = (
+        max(0, left // scale_factor - context),
+        max(0, top // scale_factor - context),
+        min(width // scale_factor, -(-right // scale_factor) + context),
+        min(height // scale_factor, -(-bottom // scale_factor) + context),
+    )
+    origin_x, origin_y = latent_box[0] * scale_factor, latent_box[1] * scale_factor
+    crop = (left - origin_x, top - origin_y, right - origin_x, bottom - origin_y)
+    return latent_box, crop
+
+
+def decode_face_crops(pipe, latents, bbox, size, margin=0.25):
+    # Decode only the face region of a batch of latents sharing one bbox
+    (lx0, ly0, lx1, ly1), crop = face_latent_box(bbox, size, pipe.vae_scale_factor, margin)
+    images = decode_latents(pipe, latents[:, :, ly0:ly1, lx0:lx1])
+    return [image.crop(crop) for image in images]
@@ -0,0 +1,619 @@
+import argparse
+import errno
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import numpy as np
+
+from diffusers.utils import load_image
+from diffusers.models import ControlNetModel
+from diffusers.pipelines.controlnet.multicontrolnet import MultiControlNetModel
+
+from insightface.app import FaceAnalysis
+
+from controlnet_aux import MidasDetector
+
+from attributes import ATTRIBUTE_GROUPS, iter_prompts, output_name
+from conditioning import CONDITIONING_VERSION, ConditioningCache, file_sha1
+from decode import OUTPUT_MODES, decode_face_crops, face_latent_box
+from face_sink import ADAFACE_CKPT, open_face_sink
+from failures import DecodeError, OutOfMemoryError, describe, failure_kind
+from instantid_pipeline import (BatchedInstantIDPipeline, controlnet_cache_report, enable_controlnet_cond_cache,
+                                enable_controlnet_measurement, enable_controlnet_skip_zero)
+from manifest import Manifest, settings_hash
+from memory_profiles import MEMORY_FALLBACK, MEMORY_PROFILES, load_with_profile, profile_device
+from prompt_cache import PromptEmbeddingCache
+from registry import REGISTRY, ModelRegistry
+from result_cache import ResultCache, job_seed, result_key
+from schedulers import SCHEDULER_PRESETS, apply_scheduler_preset
+from preprocess import (FACE_POLICIES, SDXL_BUCKETS, convert_from_image_to_cv2, draw_kps, mask_for_pipeline,
+                        render_control_mask, resize_img, resize_to_bucket, select_face)
+
+GENERATION_SETTINGS = {
+    'controlnet_conditioning_scale': [0.8, 0.8],
+    'ip_adapter_scale': 0.1,
+    'num_inference_steps': 30,
+    'guidance_scale': 5,
+}
+
+BASE_MODEL_PATH = 'stabilityai/stable-diffusion-xl-base-1.0'
+FACE_ADAPTER_PATH = './checkpoints/ip-adapter.bin'
+CONTROLNET_PATHS = ['./checkpoints/ControlNetModel', 'diffusers/controlnet-depth-sdxl-1.0-small']
+
+
+def model_dtype(device):
+    return torch.float16 if torch.device(device).type == 'cuda' else torch.float32
+
+
+def model_stack(controlnet_paths=CONTROLNET_PATHS, face_adapter=FACE_ADAPTER_PATH, dtype=torch.float16):
+    # Weights and precision besides the base model that change the pixels
+    return {'controlnets': list(controlnet_paths), 'face_adapter': face_adapter, 'dtype': str(dtype).replace('torch.', '')}
+
+
+def generation_config(scheduler='default', settings=GENERATION_SETTINGS):
+    # Pipeline settings plus the sampler preset; hashed into every job
+    return {**settings, **SCHEDULER_PRESETS[scheduler]['settings'], 'scheduler': scheduler}
+
+
+def controlnet_schedule(settings, scales=None, window=None):
+    # `scales` is one conditioning scale per ControlNet (IdentityNet, depth);
+    # a zero scale skips that branch. `window` = (start, end) fractions of the
+    # denoising steps during which the ControlNets are applied.
+    if scales is not None:
+        settings['controlnet_conditioning_scale'] = list(scales)
+    if window is not None and tuple(window) != (0.0, 1.0):
+        settings['control_guidance_start'], settings['control_guidance_end'] = window
+    else:
+        settings.pop('control_guidance_start', None)
+        settings.pop('control_guidance_end', None)
+    return settings
+
+
+def skips_controlnet(settings):
+    # Whether some ControlNet branch runs at zero scale for some steps
+    return 0 in settings['controlnet_conditioning_scale'] or 'control_guidance_start' in settings
+
+
+def job_config(settings, output_mode='image', face_policy='largest', buckets=None, model=None):
+    # Hashed settings of a sweep: the generation config plus what decides the
+    # conditioning and the saved output. The conditioning version changes when
+    # face selection or preprocessing does, so ledger rows and cached results
+    # made with the old preprocessing stop matching. Buckets change the output
+    # resolution and crop, and `model` is the model_stack() of the pipeline.
+    config = {**settings, 'face_policy': face_policy, 'preprocess': CONDITIONING_VERSION}
+    if output_mode != 'image':
+        config['output_mode'] = output_mode
+    if buckets:
+        config['buckets'] = [list(bucket) for bucket in buckets]
+    if model:
+        config['model'] = model
+    return config
+
+
+def job_settings(prompt, negative_prompt, pose_filename=None, settings=None,
+                 base_model_path=BASE_MODEL_PATH, seed=None):
+    # Everything that determines the output of one (identity, attribute) job
+    return settings_hash({
+        'base_model': base_model_path,
+        'prompt': prompt,
+        'negative_prompt': negative_prompt,
+        'pose': pose_filename,
+        'seed': seed,
+        **(settings or generation_config()),
+    })
+
+
+def sweep_jobs(groups=None, image_dir='./Images', output_dir='./Result', num_images=101, pose_filename=None,
+               settings=None, base_model_path=BASE_MODEL_PATH, base_seed=0, output_ext='.jpg'):
+    # Yield (image_filename, jobs) per identity; one job per attribute prompt
+    prompts = list(iter_prompts(groups))
+
+    for i in range(num_images):
+        image_filename = os.path.join(image_dir, f"{i}.jpg")
+
+        if not os.path.exists(image_filename):
+            print(f"Image not found: {image_filename}")
+            continue
+
+        jobs = []
+        for attribute, prompt, n_prompt in prompts:
+            seed = job_seed(i, attribute, base_seed)
+            jobs.append({
+                'identity': str(i),
+                'attribute': attribute,
+                'prompt': prompt,
+                'negative_prompt': n_prompt,
+                'seed': seed,
+                'settings': job_settings(prompt, n_prompt, pose_filename, settings, base_model_path, seed),
+                'output_path': os.path.join(output_dir, output_name(i, attribute, output_ext)),
+            })
+        yield image_filename, jobs
+
+
+class InstantIDEngine:
+    # Holds the face encoder, depth detector, both ControlNets and the SDXL
+    # pipeline so that every attribute group can be generated in one process.
+    # Each model is loaded on first use and shared through a ModelRegistry.
+
+    def __init__(self, insightface_root='/home/sgw6735/.insightface/',
+                 face_adapter=FACE_ADAPTER_PATH,
+                 controlnet_path=CONTROLNET_PATHS[0],
+                 controlnet_depth_path=CONTROLNET_PATHS[1],
+                 base_model_path=BASE_MODEL_PATH,
+                 conditioning_cache_dir=None,
+                 max_batch_size=4,
+                 prompt_cache_file=None,
+                 device='cuda',
+                 prefetch=2,
+                 preprocess_workers=1,
+                 buckets=None,
+                 seed=0,
+                 result_cache_dir=None,
+                 scheduler='default',
+                 controlnet_cache=False,
+                 measure_controlnet=False,
+                 controlnet_scales=None,
+                 control_window=None,
+                 registry=None,
+                 memory_profile='full',
+                 output_mode='image',
+                 vae_tiling=False,
+                 face_sink=None,
+                 face_policy='largest'):
+
+        self.device = torch.device(profile_device(memory_profile, device))
+        self.memory_profile = memory_profile
+        self.dtype = model_dtype(self.device)
+        self.insightface_root = insightface_root
+        self.face_adapter = face_adapter
+        self.controlnet_paths = [controlnet_path, controlnet_depth_path]
+        self.model_stack = model_stack(self.controlnet_paths, face_adapter, self.dtype)
+        self.controlnet_cache = controlnet_cache
+        self.measure_controlnet = measure_controlnet
+        self.vae_tiling = vae_tiling
+
+        # 'latent' returns SDXL latents and 'face' decodes only the face crop,
+        # for evaluation-only sweeps that never need the full image
+        self.output_mode = output_mode
+        if face_sink is not None and output_mode == 'latent':
+            raise ValueError("a face sink needs decoded outputs, not output_mode='latent'")
+        # Optional FaceSink receiving the aligned face of every output
+        self.face_sink = face_sink
+
+        # Models are loaded on first use through the shared registry, so stages
+        # that only need the face encoder never load SDXL
+        self.registry = registry or REGISTRY
+
+        # Optional fixed resolution buckets, e.g. SDXL_BUCKETS, so that all
+        # identities of the same aspect ratio share one output shape
+        self.buckets = buckets
+        # Which detection to condition on when an image has several faces
+        self.face_policy = face_policy
+        variant = '_'.join(name for name in ['buckets' if buckets else None,
+                                             face_policy if face_policy != 'largest' else None] if name)
+        self.conditioning_cache = ConditioningCache(conditioning_cache_dir, variant=variant or None)
+        self.prompt_cache = PromptEmbeddingCache(lambda: self.pipe, prompt_cache_file, model_id=base_model_path)
+        self.max_batch_size = max_batch_size
+        self.base_model_path = base_model_path
+        self.settings = dict(GENERATION_SETTINGS)
+        self.set_scheduler(scheduler)
+        self.set_controlnet_schedule(controlnet_scales, control_window)
+        self.seed = seed
+        self.result_cache = ResultCache(result_cache_dir, OUTPUT_MODES[output_mode]) if result_cache_dir else None
+        self._init_io(prefetch, preprocess_workers)
+
+    @property
+    def app(self):
+        return self.registry.get(('face_analysis', self.insightface_root, str(self.device)), self._load_face_analysis)
+
+    @property
+    def midas(self):
+        return self.registry.get(('midas', 'lllyasviel/Annotators'), self._load_midas)
+
+    @property
+    def pipe(self):
+        pipe = self.registry.get(self._pipeline_key(), self._load_pipeline)
+        if getattr(pipe, '_scheduler_preset', 'default') != self.scheduler_preset:
+            apply_scheduler_preset(pipe, self.scheduler_preset)
+            pipe._scheduler_preset = self.scheduler_preset
+        return pipe
+
+    def _pipeline_key(self):
+        # Includes every flag that patches the loaded pipeline, so engines with
+        # different flags never share one
+        return ('pipeline', self.base_model_path, *self.controlnet_paths, self.face_adapter, str(self.device),
+                self.memory_profile, self.vae_tiling, self.controlnet_cache, self.measure_controlnet)
+
+    def set_memory_profile(self, name):
+        # Unload the pipeline; it is reloaded with the new profile on next use
+        if torch.device(profile_device(name, self.device)) != self.device:
+            raise ValueError(f"memory profile '{name}' needs a different device than {self.device}")
+        self.registry.unload(self._pipeline_key())
+        self.memory_profile = name
+
+    def _load_face_analysis(self):
+        use_cuda = self.device.type == 'cuda'
+        device_index = self.device.index or 0
+        if use_cuda:
+            providers = [('CUDAExecutionProvider', {'device_id': device_index}), 'CPUExecutionProvider']
+        else:
+            providers = ['CPUExecutionProvider']
+        app = FaceAnalysis(name='antelopev2', root=self.insightface_root, providers=providers)
+        app.prepare(ctx_id=device_index if use_cuda else -1, det_size=(640, 640))
+        return app
+
+    def _load_midas(self):
+        return MidasDetector.from_pretrained("lllyasviel/Annotators")
+
+    def _load_pipeline(self):
+        controlnet_model_list = []
+        for path in self.controlnet_paths:
+            controlnet = ControlNetModel.from_pretrained(path, torch_dtype=self.dtype)
+            controlnet_model_list.append(controlnet)
+        controlnet = MultiControlNetModel(controlnet_model_list)
+
+        pipe = BatchedInstantIDPipeline.from_pretrained(
+            self.base_model_path,
+            controlnet=controlnet,
+            torch_dtype=self.dtype,
+        )
+        load_with_profile(pipe, self.memory_profile, self.device,
+                          lambda pipe: pipe.load_ip_adapter_instantid(self.face_adapter))
+
+        # Reuse the prompt-independent ControlNet conditioning stem across
+        # denoising steps and attribute variants of the same face
+        if self.controlnet_cache:
+            enable_controlnet_cond_cache(pipe)
+        # Zero-scale branches are only gated when the schedule has any
+        if skips_controlnet(self.settings):
+            enable_controlnet_skip_zero(pipe)
+        if self.measure_controlnet:
+            enable_controlnet_measurement(pipe)
+        # Decode large images tile by tile to bound VAE memory
+        if self.vae_tiling:
+            pipe.enable_vae_tiling()
+        return pipe
+
+    def set_scheduler(self, name):
+        # The pipeline itself is switched the next time it is used
+        self.settings.update(SCHEDULER_PRESETS[name]['settings'])
+        self.scheduler_preset = name
+
+    def set_controlnet_schedule(self, scales=None, window=None):
+        controlnet_schedule(self.settings, scales, window)
+        if skips_controlnet(self.settings) and self.registry.loaded(self._pipeline_key()):
+            enable_controlnet_skip_zero(self.pipe)
+
+    def job_config(self):
+        return job_config({**self.settings, 'scheduler': self.scheduler_preset}, self.output_mode, self.face_policy,
+                          self.buckets, self.model_stack)
+
+    def _init_io(self, prefetch, preprocess_workers):
+        # Conditioning for the next `prefetch` identities is prepared on a
+        # thread pool while the current one denoises, and outputs are encoded
+        # and saved on a single background writer thread. Failed jobs are
+        # collected in `failure_log` with their failure kind.
+        self.prefetch = prefetch
+        self.preprocess_workers = preprocess_workers
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending_writes = []
+        self._awaiting_sink = []
+        self.failure_log = []
+
+    def detect_image(self, image):
+        face_info = self.app.get(convert_from_image_to_cv2(image))
+        return select_face(face_info, self.face_policy, image.size)
+
+    def detect(self, image_filename):
+        # Decode, resize and detect a single image; returns the image and the selected face
+        # Undecodable or truncated files are permanent failures. Missing files
+        # and OS-level read errors (permissions, network mounts), which carry
+        # an errno unlike PIL's decoder errors, stay retryable 'io' failures.
+        if not os.path.isfile(image_filename):
+            raise FileNotFoundError(errno.ENOENT, 'image not found', image_filename)
+        try:
+            image = load_image(image_filename)
+        except ValueError as e:
+            raise DecodeError(f'cannot decode {image_filename}: {e}') from e
+        except OSError as e:
+            if e.errno is not None:
+                raise
+            raise DecodeError(f'cannot decode {image_filename}: {e}') from e
+        if self.buckets:
+            image, _ = resize_to_bucket(image, self.buckets)
+        else:
+            image = resize_img(image)
+        return image, self.detect_image(image)
+
+    def prepare(self, image_filename, pose_filename=None):
+        face_image, face_info = self.detect(image_filename)
+        face_emb = face_info['embedding']
+
+        # Use another reference image only when a different pose image is given
+        if pose_filename is None or os.path.abspath(pose_filename) == os.path.abspath(image_filename):
+            pose_image = face_image
+        else:
+            pose_image, face_info = self.detect(pose_filename)
+
+        face_kps = draw_kps(pose_image.size, face_info['kps'])
+
+        # Use depth control
+        processed_image_midas = self.midas(pose_image)
+        processed_image_midas = processed_image_midas.resize(pose_image.size)
+
+        # Enhance face region
+        control_mask = render_control_mask(face_info['bbox'], pose_image.size)
+
+        return {
+            'face_emb': face_emb,
+            'face_kps': face_kps,
+            'depth': processed_image_midas,
+            'control_mask': control_mask,
+            'kps': np.asarray(face_info['kps']),
+            'bbox': np.asarray(face_info['bbox']),
+        }
+
+    def generate(self, conditioning, prompt, negative_prompt, seed=None):
+        return self.generate_batch(conditioning, [prompt], [negative_prompt], None if seed is None else [seed])[0]
+
+    def generate_batch(self, conditioning, prompts, negative_prompts, seeds=None):
+        # All prompts share the identity's face embedding, control images and mask.
+        # Noise is drawn on the CPU so a seed gives the same latents on any device.
+        generator = None
+        if seeds is not None:
+            generator = [torch.Generator('cpu').manual_seed(seed) for seed in seeds]
+        images = self.pipe(
+            **self.prompt_cache.batch(prompts, negative_prompts),
+            generator=generator,
+            image_embeds=conditioning['face_emb'],
+            control_mask=mask_for_pipeline(conditioning['control_mask']),
+            image=[conditioning['face_kps'], conditioning['depth']],
+            output_type='pil' if self.output_mode == 'image' else 'latent',
+            **self.settings,
+        ).images
+
+        if self.output_mode == 'latent':
+            return [latents.cpu().numpy() for latents in images]
+        if self.output_mode == 'face':
+            return decode_face_crops(self.pipe, images, conditioning['bbox'], conditioning['face_kps'].size)
+        return images
+
+    def prepare_cached(self, image_filename, pose_filename=None):
+        return self.conditioning_cache.get(image_filename, self.prepare, pose_filename)
+
+    def _fetch_cached_results(self, image_filename, jobs, pose_filename=None, manifest=None):
+        # Serve jobs already in the result cache; returns the jobs still to
+        # generate and the served jobs that still have to reach the face sink
+        source_hash = file_sha1(image_filename)
+        pose_hash = file_sha1(pose_filename) if pose_filename is not None else None
+
+        misses, hits = [], []
+        for job in jobs:
+            job['result_key'] = result_key(source_hash, job['settings'], pose_hash)
+            if not self.result_cache.fetch(job['result_key'], job['output_path']):
+                misses.append(job)
+            elif self.face_sink is not None:
+                hits.append(job)
+            elif manifest is not None:
+                self._mark_done(job, manifest)
+        return misses, hits
+
+    def _mark_done(self, job, manifest):
+        manifest.mark_done(job['identity'], job['attribute'], job['settings'], job['output_path'], job.get('seed'))
+
+    def output_kps(self, conditioning):
+        # Face keypoints in the coordinates of the saved output
+        kps = conditioning.get('kps')
+        if kps is None or self.output_mode != 'face':
+            return kps
+        (lx0, ly0, _, _), crop = face_latent_box(conditioning['bbox'], conditioning['face_kps'].size,
+                                                  self.pipe.vae_scale_factor)
+        return kps - [lx0 * self.pipe.vae_scale_factor + crop[0], ly0 * self.pipe.vae_scale_factor + crop[1]]
+
+    def _save(self, image, job, kps=None):
+        if isinstance(image, np.ndarray):
+            with open(job['output_path'], 'wb') as f:
+                np.save(f, image)
+        else:
+            image.save(job['output_path'])
+        if self.face_sink is not None and kps is not None:
+            job['sink_seq'] = self.face_sink.add(image, kps, job)
+        if self.result_cache is not None and job.get('result_key'):
+            self.result_cache.store(job['result_key'], job['output_path'])
+
+    def _sink_cached(self, job, kps):
+        # Cached outputs reach the face sink like generated ones
+        if kps is not None:
+            job['sink_seq'] = self.face_sink.add(load_image(job['output_path']), kps, job)
+
+    def _generate_jobs(self, conditioning, batch):
+        # On out-of-memory, switch to the next smaller memory profile and retry.
+        # The switch happens outside the except block so the failed call's
+        # tensors, held by the traceback, are freed first.
+        while True:
+            try:
+                return self.generate_batch(conditioning,
+                                           [job['prompt'] for job in batch],
+                                           [job['negative_prompt'] for job in batch],
+                                           [job['seed'] for job in batch] if all('seed' in job for job in batch) else None)
+            except Exception as e:
+                fallback = MEMORY_FALLBACK.get(self.memory_profile)
+                if failure_kind(e) != OutOfMemoryError.kind or fallback is None:
+                    raise
+            print(f"Out of memory with profile '{self.memory_profile}', retrying with '{fallback}'")
+            self.set_memory_profile(fallback)
+
+    def _record_failure(self, image_filename, jobs, error, manifest=None):
+        kind = failure_kind(error)
+        print(f"Error processing {image_filename} ({', '.join(str(job['attribute']) for job in jobs)}): {describe(error)}")
+        for job in jobs:
+            self.failure_log.append({'identity': job['identity'], 'attribute': job['attribute'], 'kind': kind,
+                                     'error': str(error)})
+            if manifest is not None:
+                manifest.mark_failed(job['identity'], job['attribute'], job['settings'], error, kind=kind)
+
+    def failure_report(self):
+        # Failed jobs of this process per failure kind
+        report = {}
+        for failure in self.failure_log:
+            report.setdefault(failure['kind'], []).append(failure)
+        return report
+
+    def run_jobs(self, image_filename, jobs, pose_filename=None, manifest=None, conditioning=None):
+        # Generate all jobs of one identity, sharing its conditioning. `conditioning`
+        # may be a future from the prefetch pool.
+        hits = []
+        if self.result_cache is not None:
+            jobs, hits = self._fetch_cached_results(image_filename, jobs, pose_filename, manifest)
+            if not jobs and not hits:
+                return
+
+        try:
+            if conditioning is None:
+                conditioning = self.prepare_cached(image_filename, pose_filename)
+            elif hasattr(conditioning, 'result'):
+                conditioning = conditioning.result()
+        except Exception as e:
+            if jobs:
+                self._record_failure(image_filename, jobs, e, manifest)
+            # Cached outputs are complete even when their face cannot be sunk
+            if manifest is not None:
+                for job in hits:
+                    self._mark_done(job, manifest)
+            return
+
+        kps = self.output_kps(conditioning) if self.face_sink is not None else None
+        for job in hits:
+            self._pending_writes.append((job, self._writer.submit(self._sink_cached, job, kps)))
+        for start in range(0, len(jobs), self.max_batch_size):
+            batch = jobs[start:start + self.max_batch_size]
+            try:
+                images = self._generate_jobs(conditioning, batch)
+                for job, image in zip(batch, images):
+                    self._pending_writes.append((job, self._writer.submit(self._save, image, job, kps)))
+
+            except Exception as e:
+                self._record_failure(image_filename, batch, e, manifest)
+
+            self.flush_writes(manifest, wait=False)
+
+        self.prompt_cache.save()
+
+    def flush_writes(self, manifest=None, wait=True):
+        # Record finished background saves; the manifest is only touched from
+        # the calling thread because SQLite connections are thread-bound
+        remaining = []
+        for job, future in self._pending_writes:
+            if not wait and not future.done():
+                remaining.append((job, future))
+                continue
+            try:
+                future.result()
+            except Exception as e:
+                self._record_failure(job['output_path'], [job], e, manifest)
+            else:
+                self._awaiting_sink.append(job)
+        self._pending_writes = remaining
+        if wait and self.face_sink is not None:
+            self.face_sink.flush()
+
+        # A job is done once its face, if it has one, is in a written shard, so
+        # a killed sweep regenerates outputs whose face was still buffered
+        written = self.face_sink.written if self.face_sink is not None else 0
+        awaiting = []
+        for job in self._awaiting_sink:
+            if job.get('sink_seq', -1) >= written:
+                awaiting.append(job)
+            elif manifest is not None:
+                self._mark_done(job, manifest)
+        self._awaiting_sink = awaiting
+
+    def run(self, groups=None, image_dir='./Images', output_dir='./Result', num_images=101, pose_filename=None,
+            manifest=None):
+        # Identity-major order: the conditioning of a face is computed once
+        # and shared by all of its attribute prompts
+        identities = sweep_jobs(groups, image_dir, output_dir, num_images, pose_filename,
+                                self.job_config(), self.base_model_path, self.seed, OUTPUT_MODES[self.output_mode])
+
+        with ThreadPoolExecutor(max_workers=self.preprocess_workers) as pool:
+            queued = deque()
+            for image_filename, jobs in identities:
+                if manifest is not None:
+                    jobs = [job for job in jobs if manifest.needs_run(job['identity'], job['attribute'], job['settings'])]
+                if not jobs:
+                    continue
+
+                queued.append((image_filename, jobs, pool.submit(self.prepare_cached, image_filename, pose_filename)))
+                if len(queued) > self.prefetch:
+                    image_filename, jobs, future = queued.popleft()
+                    self.run_jobs(image_filename, jobs, pose_filename, manifest, future)
+            while queued:
+                image_filename, jobs, future = queued.popleft()
+                self.run_jobs(image_filename, jobs, pose_filename, manifest, future)
+
+        self.flush_writes(manifest)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Generate InstantID attribute edits for all attribute groups in one process.')
+    parser.add_argument('--groups', nargs='+', choices=list(ATTRIBUTE_GROUPS.keys()), default=None)
+    parser.add_argument('--images', default='./Images')
+    parser.add_argument('--output', default='./Result')
+    parser.add_argument('--num-images', type=int, default=101)
+    parser.add_argument('--pose', default=None, help='separate pose reference image used for keypoints, depth and mask')
+    parser.add_argument('--max-batch-size', type=int, default=4, help='attribute prompts denoised together per identity')
+    parser.add_argument('--conditioning-cache', default=None, help='directory to persist per-identity conditioning')
+    parser.add_argument('--prompt-cache', default=None, help='file to persist prompt embeddings')
+    parser.add_argument('--face-policy', choices=FACE_POLICIES, default='largest',
+                        help='face to condition on when an image has several')
+    parser.add_argument('--buckets', action='store_true', help='resize inputs to the nearest SDXL resolution bucket')
+    parser.add_argument('--scheduler', choices=list(SCHEDULER_PRESETS.keys()), default='default', help='sampler preset')
+    parser.add_argument('--controlnet-cache', action='store_true', help='reuse ControlNet conditioning-image features')
+    parser.add_argument('--measure-controlnet', action='store_true', help='report per-step ControlNet time and cache savings')
+    parser.add_argument('--controlnet-scales', nargs=2, type=float, default=None, metavar=('IDENTITY', 'DEPTH'),
+                        help='ControlNet conditioning scales; 0 skips the branch')
+    parser.add_argument('--control-window', nargs=2, type=float, default=None, metavar=('START', 'END'),
+                        help='fraction of denoising steps during which ControlNets are applied, e.g. 0 0.6')
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES.keys()), default='full',
+                        help='how the SDXL pipeline is placed in memory (offload, slicing, cpu)')
+    parser.add_argument('--output-mode', choices=list(OUTPUT_MODES.keys()), default='image',
+                        help="'latent' saves latents, 'face' decodes and saves only the face crop")
+    parser.add_argument('--vae-tiling', action='store_true', help='decode the VAE in tiles for large resolutions')
+    parser.add_argument('--face-sink', default=None, help='directory receiving aligned 112x112 faces of every output')
+    parser.add_argument('--adaface-dir', default=None, help='AdaFace checkout; adds embeddings to the face sink')
+    parser.add_argument('--adaface-ckpt', default=ADAFACE_CKPT)
+    parser.add_argument('--memory-budget-gb', type=float, default=None,
+                        help='unload least recently used models once loaded models exceed this size')
+    parser.add_argument('--seed', type=int, default=0, help='base seed; each (identity, attribute) derives its own')
+    parser.add_argument('--result-cache', default=None, help='content-addressed store of generated images')
+    parser.add_argument('--prefetch', type=int, default=2, help='identities whose conditioning is prepared ahead of generation')
+    parser.add_argument('--manifest', default=None, help='SQLite ledger used to skip finished jobs and resume sweeps')
+    parser.add_argument('--max-attempts', type=int, default=3, help='attempts per job before it is no longer retried')
+    args = parser.parse_args()
+
+    face_sink = None
+    if args.face_sink:
+        face_sink = open_face_sink(args.face_sink, args.adaface_dir, args.adaface_ckpt,
+                                   'cuda' if torch.cuda.is_available() else 'cpu')
+
+    engine = InstantIDEngine(conditioning_cache_dir=args.conditioning_cache, max_batch_size=args.max_batch_size,
+                             prompt_cache_file=args.prompt_cache, prefetch=args.prefetch,
+                             buckets=SDXL_BUCKETS if args.buckets else None, seed=args.seed,
+                             result_cache_dir=args.result_cache, scheduler=args.scheduler,
+                             controlnet_cache=args.controlnet_cache, measure_controlnet=args.measure_controlnet,
+                             controlnet_scales=args.controlnet_scales, control_window=args.control_window,
+                             registry=ModelRegistry(args.memory_budget_gb * 2**30) if args.memory_budget_gb else None,
+                             memory_profile=args.memory_profile, output_mode=args.output_mode,
+                             vae_tiling=args.vae_tiling, face_sink=face_sink, face_policy=args.face_policy)
+    manifest = Manifest(args.manifest, max_attempts=args.max_attempts) if args.manifest else None
+    engine.run(args.groups, image_dir=args.images, output_dir=args.output, num_images=args.num_images,
+               pose_filename=args.pose, manifest=manifest)
+    if manifest is not None:
+        print(manifest.summary())
+    for kind, failures in engine.failure_report().items():
+        print(f"{kind}: {len(failures)} failed jobs")
+    if args.measure_controlnet:
+        print(controlnet_cache_report(engine.pipe))
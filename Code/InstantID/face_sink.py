@@ -0,0 +1,113 @@
+import glob
+import os
+import sys
+
+import numpy as np
+import torch
+
+from insightface.utils import face_align
+
+
+ADAFACE_CKPT = 'pretrained/adaface_ir50_ms1mv2.ckpt'
+
+
+def load_adaface(adaface_dir, checkpoint=ADAFACE_CKPT, architecture='ir_50'):
+    # AdaFace model from a checkout of https://github.com/mk-minchul/AdaFace,
+    # loaded the same way as in the t-SNE scripts
+    sys.path.insert(0, adaface_dir)
+    import net
+    model = net.build_model(architecture)
+    statedict = torch.load(checkpoint, map_location=torch.device('cpu'))['state_dict']
+    model.load_state_dict({key[6:]: val for key, val in statedict.items() if key.startswith('model.')})
+    model.eval()
+    return model
+
+
+def align_face(image, kps, size=112):
+    # 5-point similarity alignment to the ArcFace / AdaFace 112x112 template;
+    # keeps the channel order of `image`
+    return face_align.norm_crop(np.asarray(image), landmark=np.asarray(kps, dtype=np.float32), image_size=size)
+
+
+def adaface_input(faces):
+    # (N, 112, 112, 3) uint8 RGB -> normalised BGR NCHW tensor
+    bgr = torch.from_numpy(np.ascontiguousarray(faces[..., ::-1])).permute(0, 3, 1, 2).float()
+    return bgr.div_(255.).sub_(0.5).div_(0.5)
+
+
+def open_face_sink(sink_dir, adaface_dir=None, adaface_ckpt=ADAFACE_CKPT, device='cpu'):
+    # FaceSink with AdaFace embeddings when a checkout is given; used by
+    # engine.py and by every scheduler.py worker
+    model = load_adaface(adaface_dir, adaface_ckpt) if adaface_dir else None
+    return FaceSink(sink_dir, model, device=device)
+
+
+class FaceSink:
+    # Receives each generated output with the keypoints it was conditioned on,
+    # keeps the aligned 112x112 face and, given an AdaFace model, its
+    # embedding, and writes them to `sink_dir` in .npz shards of `shard_size`.
+    # The IdentityNet places the face on the conditioning keypoints, so outputs
+    # are aligned without detecting the face again; benchmark.py
+    # --check-face-sink measures how far re-detection would move them. Shards
+    # are renamed into place once complete and can be read while a sweep is
+    # still running, e.g. by the t-SNE EmbeddingStore.import_face_sink.
+
+    def __init__(self, sink_dir, model=None, shard_size=256, device='cpu', batch_size=64):
+        self.sink_dir = sink_dir
+        self.model = model.to(device) if model is not None else None
+        self.shard_size = shard_size
+        self.device = device
+        self.batch_size = batch_size
+        self._records = []
+        self._shards = 0
+        # Records added so far and records written to completed shards
+        self.added = 0
+        self.written = 0
+        os.makedirs(sink_dir, exist_ok=True)
+
+    def add(self, image, kps, job):
+        # Returns the record's sequence number; it is on disk once `written` exceeds it
+        self._records.append((align_face(image, kps), np.asarray(kps, dtype=np.float32), job))
+        seq = self.added
+        self.added += 1
+        if len(self._records) >= self.shard_size:
+            self.flush()
+        return seq
+
+    def embed(self, faces):
+        features = []
+        with torch.inference_mode():
+            for start in range(0, len(faces), self.batch_size):
+                feature, _ = self.model(adaface_input(faces[start:start + self.batch_size]).to(self.device))
+                features.append(feature.float().cpu().numpy())
+        return np.concatenate(features)
+
+    def flush(self):
+        if not self._records:
+            return
+        faces = np.stack([face for face, _, _ in self._records])
+        jobs = [job for _, _, job in self._records]
+        data = {
+            'faces': faces,
+            'kps': np.stack([kps for _, kps, _ in self._records]),
+            'identity': np.array([job['identity'] for job in jobs]),
+            'attribute': np.array(['' if job['attribute'] is None else str(job['attribute']) for job in jobs]),
+            'output_path': np.array([os.path.abspath(job['output_path']) for job in jobs]),
+        }
+        if self.model is not None:
+            data['embeddings'] = self.embed(faces)
+
+        path = os.path.join(self.sink_dir, f'faces_{os.getpid()}_{self._shards:05d}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **data)
+        os.replace(path + '.tmp', path)
+        self._shards += 1
+        self.written += len(self._records)
+        self._records = []
+
+
+def iter_face_shards(sink_dir):
+    # Completed shards, as dicts of arrays
+    for path in sorted(glob.glob(os.path.join(sink_dir, 'faces_*.npz'))):
+        with np.load(path) as shard:
+            yield {key: shard[key] for key in shard.files}
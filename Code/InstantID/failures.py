@@ -0,0 +1,42 @@
+from PIL import UnidentifiedImageError
+
+import torch
+
+
+class GenerationError(Exception):
+    # Base class of the failures a generation job is recorded with
+    kind = 'error'
+
+
+class NoFaceError(GenerationError):
+    kind = 'no_face'
+
+
+class DecodeError(GenerationError):
+    kind = 'decode'
+
+
+class OutOfMemoryError(GenerationError):
+    kind = 'oom'
+
+
+# Failures that repeat on every attempt with the same inputs and settings,
+# so they are recorded once and not retried
+PERMANENT_FAILURES = (NoFaceError.kind, DecodeError.kind)
+
+
+def failure_kind(error):
+    # Map an exception to one of 'no_face', 'decode', 'oom', 'io' or 'error'
+    if isinstance(error, GenerationError):
+        return error.kind
+    if isinstance(error, torch.cuda.OutOfMemoryError) or 'out of memory' in str(error).lower():
+        return OutOfMemoryError.kind
+    if isinstance(error, UnidentifiedImageError):
+        return DecodeError.kind
+    if isinstance(error, OSError):
+        return 'io'
+    return GenerationError.kind
+
+
+def describe(error):
+    return f'{failure_kind(error)}: {type(error).__name__}: {error}'
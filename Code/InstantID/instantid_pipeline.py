@@ -0,0 +1,187 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+import torch
+
+from pipeline_stable_diffusion_xl_instantid_full import StableDiffusionXLInstantIDPipeline
+
+
+class BatchedInstantIDPipeline(StableDiffusionXLInstantIDPipeline):
+    # The upstream pipeline projects one face embedding to (uncond, cond) x
+    # num_images_per_prompt, which only lines up with the text embeddings for a
+    # single prompt. Here the projected embedding is repeated over the prompt
+    # batch, so several attribute prompts of one identity (same face embedding,
+    # control images and mask) run through the UNet and ControlNets together.
+
+    _prompt_batch_size = 1
+
+    @torch.no_grad()
+    def __call__(self, *args, **kwargs):
+        prompt = kwargs.get('prompt')
+        if isinstance(prompt, list):
+            self._prompt_batch_size = len(prompt)
+        elif kwargs.get('prompt_embeds') is not None:
+            self._prompt_batch_size = kwargs['prompt_embeds'].shape[0]
+        else:
+            self._prompt_batch_size = 1
+
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            self._prompt_batch_size = 1
+
+    def _encode_prompt_image_emb(self, *args, **kwargs):
+        prompt_image_emb = super()._encode_prompt_image_emb(*args, **kwargs)
+        if self._prompt_batch_size == 1:
+            return prompt_image_emb
+
+        # [uncond * n, cond * n] with classifier-free guidance, [cond * n] without
+        chunks = prompt_image_emb.chunk(2) if self.do_classifier_free_guidance else (prompt_image_emb,)
+        return torch.cat([chunk.repeat(self._prompt_batch_size, 1, 1) for chunk in chunks])
+
+
+class CachedCondEmbedding(torch.nn.Module):
+    # Wraps a ControlNet's conditioning-image stem (controlnet_cond_embedding).
+    # The stem only sees the control image, which is the same for every
+    # denoising step and every attribute prompt of an identity, so its output
+    # is memoised by content. A batch of identical control images (one
+    # identity, several prompts) is embedded once and broadcast.
+
+    def __init__(self, embedding, max_items=4):
+        super().__init__()
+        self.embedding = embedding
+        self.max_items = max_items
+        self.measure = False
+        self.stats = {'calls': 0, 'hits': 0, 'miss_time': 0.0}
+        self._seen = []
+        self._outputs = OrderedDict()
+
+    def _digest(self, cond):
+        # Hash each new control tensor once; later steps pass the same object
+        for seen, digest in self._seen:
+            if seen is cond:
+                return digest
+        first = cond[:1]
+        uniform = bool(torch.equal(cond, first.expand_as(cond)))
+        hashed = first if uniform else cond
+        digest = (hashlib.sha1(hashed.detach().float().cpu().numpy().tobytes()).hexdigest(), uniform)
+        self._seen = (self._seen + [(cond, digest)])[-self.max_items:]
+        return digest
+
+    def forward(self, cond):
+        self.stats['calls'] += 1
+        digest, uniform = self._digest(cond)
+        key = (digest, uniform, tuple(cond.shape), cond.dtype, str(cond.device))
+
+        output = self._outputs.get(key)
+        if output is not None:
+            self.stats['hits'] += 1
+            self._outputs.move_to_end(key)
+            return output
+
+        if self.measure and cond.is_cuda:
+            torch.cuda.synchronize(cond.device)
+        start = time.perf_counter()
+        if uniform:
+            output = self.embedding(cond[:1]).expand(cond.shape[0], -1, -1, -1)
+        else:
+            output = self.embedding(cond)
+        if self.measure and cond.is_cuda:
+            torch.cuda.synchronize(cond.device)
+        self.stats['miss_time'] += time.perf_counter() - start
+
+        self._outputs[key] = output
+        if len(self._outputs) > self.max_items:
+            self._outputs.popitem(last=False)
+        return output
+
+
+def controlnet_nets(pipe):
+    controlnet = pipe.controlnet
+    return list(controlnet.nets) if hasattr(controlnet, 'nets') else [controlnet]
+
+
+def enable_controlnet_cond_cache(pipe, max_items=4):
+    for net in controlnet_nets(pipe):
+        if not isinstance(net.controlnet_cond_embedding, CachedCondEmbedding):
+            net.controlnet_cond_embedding = CachedCondEmbedding(net.controlnet_cond_embedding, max_items)
+
+
+def enable_controlnet_skip_zero(pipe, max_items=4):
+    # Skip a ControlNet branch whenever its effective scale is zero (scale 0,
+    # or a step outside control_guidance_start/end) and return cached zero
+    # residuals instead. Nets are patched in place rather than removed because
+    # the InstantID pipeline treats index 0 as the IdentityNet. Zeros are only
+    # kept for the last `max_items` sample shapes of each net.
+    for net in controlnet_nets(pipe):
+        if getattr(net, '_skip_zero', False):
+            continue
+        forward = net.forward
+        zeros = OrderedDict()
+
+        def gated_forward(sample, *args, conditioning_scale=1.0, return_dict=True, _forward=forward, _zeros=zeros, **kwargs):
+            if conditioning_scale != 0 or return_dict:
+                return _forward(sample, *args, conditioning_scale=conditioning_scale, return_dict=return_dict, **kwargs)
+            key = (tuple(sample.shape), sample.dtype, str(sample.device))
+            if key in _zeros:
+                _zeros.move_to_end(key)
+                return _zeros[key]
+            down_block_res_samples, mid_block_res_sample = _forward(sample, *args, conditioning_scale=0,
+                                                                    return_dict=False, **kwargs)
+            _zeros[key] = ([torch.zeros_like(t) for t in down_block_res_samples], torch.zeros_like(mid_block_res_sample))
+            if len(_zeros) > max_items:
+                _zeros.popitem(last=False)
+            return _zeros[key]
+
+        net.forward = gated_forward
+        net._skip_zero = True
+
+
+def enable_controlnet_measurement(pipe):
+    # Time every ControlNet forward (synchronised) and the stem misses, so the
+    # per-step time saved by the conditioning cache can be reported
+    timings = {'calls': 0, 'time': 0.0}
+
+    def pre_hook(module, args):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        module._measure_start = time.perf_counter()
+
+    def post_hook(module, args, output):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        timings['calls'] += 1
+        timings['time'] += time.perf_counter() - module._measure_start
+
+    for net in controlnet_nets(pipe):
+        net.register_forward_pre_hook(pre_hook)
+        net.register_forward_hook(post_hook)
+        if isinstance(net.controlnet_cond_embedding, CachedCondEmbedding):
+            net.controlnet_cond_embedding.measure = True
+    pipe._controlnet_timings = timings
+
+
+def controlnet_cache_report(pipe):
+    timings = getattr(pipe, '_controlnet_timings', None)
+    report = {}
+    for index, net in enumerate(controlnet_nets(pipe)):
+        stem = net.controlnet_cond_embedding
+        if not isinstance(stem, CachedCondEmbedding):
+            continue
+        stats = stem.stats
+        misses = stats['calls'] - stats['hits']
+        mean_miss = stats['miss_time'] / misses if misses else 0.0
+        report[f'controlnet_{index}'] = {
+            'stem_calls': stats['calls'],
+            'stem_hits': stats['hits'],
+            'stem_time_saved_s': stats['hits'] * mean_miss,
+        }
+
+    if timings and timings['calls']:
+        # Every denoising step runs each ControlNet once
+        steps = timings['calls'] / len(controlnet_nets(pipe))
+        saved = sum(entry['stem_time_saved_s'] for entry in report.values())
+        report['controlnet_time_per_step_s'] = timings['time'] / steps
+        report['stem_time_saved_per_step_s'] = saved / steps
+    return report
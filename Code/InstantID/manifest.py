@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from failures import PERMANENT_FAILURES
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# Columns added after the first ledger format, migrated in place
+EXTRA_COLUMNS = {
+    'payload': 'TEXT',
+    'lease_owner': 'TEXT',
+    'lease_expires': 'REAL',
+    'failure_kind': 'TEXT',
+    'sweep': 'TEXT',
+}
+
+
+def settings_hash(settings):
+    # Stable hash of everything that changes the generated image
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Manifest:
+    # SQLite ledger of (identity, attribute, settings hash) -> seed, output
+    # path and status, so a sweep can be killed and resumed: completed jobs
+    # whose output still exists are skipped and failed jobs are retried until
+    # `max_attempts` is reached. The same table doubles as a work queue for
+    # several worker processes: jobs are enqueued with their payload and
+    # leased for a limited time, so jobs of a crashed worker are picked up
+    # again once the lease expires. Queued jobs carry the id of their sweep so
+    # that workers only lease rows rendered with their own settings. Failures are recorded with their kind
+    # (see failures.py); permanent ones such as no face found are not retried.
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' identity TEXT NOT NULL,'
+            ' attribute TEXT NOT NULL,'
+            ' settings_hash TEXT NOT NULL,'
+            ' seed INTEGER,'
+            ' output_path TEXT,'
+            ' status TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' updated REAL,'
+            ' PRIMARY KEY (identity, attribute, settings_hash))'
+        )
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        for name, kind in EXTRA_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {kind}')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _row(self, identity, attribute, settings):
+        return self.conn.execute(
+            'SELECT status, output_path, attempts, lease_expires, failure_kind FROM jobs'
+            ' WHERE identity=? AND attribute=? AND settings_hash=?',
+            (identity, str(attribute), settings),
+        ).fetchone()
+
+    def needs_run(self, identity, attribute, settings):
+        row = self._row(identity, attribute, settings)
+        if row is None:
+            return True
+        status, output_path, attempts, lease_expires, failure_kind = row
+        if status == DONE:
+            return not (output_path and os.path.exists(output_path))
+        if status == LEASED and lease_expires is not None and lease_expires > time.time():
+            return False
+        if status == FAILED and failure_kind in PERMANENT_FAILURES:
+            return False
+        return attempts < self.max_attempts
+
+    def _record(self, identity, attribute, settings, status, seed=None, output_path=None, error=None, attempt=False,
+                kind=None):
+        self.conn.execute(
+            'INSERT INTO jobs (identity, attribute, settings_hash, seed, output_path, status, attempts, error, updated,'
+            ' failure_kind)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (identity, attribute, settings_hash) DO UPDATE SET'
+            '  seed=COALESCE(excluded.seed, seed), output_path=COALESCE(excluded.output_path, output_path),'
+            '  status=excluded.status, attempts=attempts + excluded.attempts, error=excluded.error, updated=excluded.updated,'
+            '  failure_kind=excluded.failure_kind, lease_owner=NULL, lease_expires=NULL',
+            (identity, str(attribute), settings, seed, output_path, status, int(attempt), error, time.time(), kind),
+        )
+        self.conn.commit()
+
+    def mark_done(self, identity, attribute, settings, output_path, seed=None):
+        self._record(identity, attribute, settings, DONE, seed=seed, output_path=output_path, attempt=True)
+
+    def mark_failed(self, identity, attribute, settings, error, seed=None, kind=None):
+        self._record(identity, attribute, settings, FAILED, seed=seed, error=str(error), attempt=True, kind=kind)
+
+    def enqueue(self, identity, attribute, settings, output_path, payload, sweep=None):
+        # Add a job to the queue unless it is already finished or queued
+        if not self.needs_run(identity, attribute, settings):
+            return False
+        self.conn.execute(
+            'INSERT INTO jobs (identity, attribute, settings_hash, output_path, status, payload, updated, sweep)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (identity, attribute, settings_hash) DO UPDATE SET'
+            '  output_path=excluded.output_path, payload=excluded.payload, sweep=excluded.sweep,'
+            '  status=CASE WHEN status=? THEN ? ELSE status END, updated=excluded.updated',
+            (identity, str(attribute), settings, output_path, PENDING, json.dumps(dict(payload, attribute=attribute)),
+             time.time(), sweep, DONE, PENDING),
+        )
+        self.conn.commit()
+        return True
+
+    def lease(self, owner, limit=1, lease_seconds=1800, sweep=None):
+        # Lease up to `limit` runnable jobs of a single identity so they can
+        # share conditioning and one batched generation call. With `sweep`,
+        # only jobs enqueued by that sweep are leased; rows left by sweeps
+        # with other settings stay untouched.
+        now = time.time()
+        permanent = ', '.join('?' * len(PERMANENT_FAILURES))
+        runnable = (
+            f'(status=? OR (status=? AND attempts < ? AND (failure_kind IS NULL OR failure_kind NOT IN ({permanent})))'
+            ' OR (status=? AND lease_expires < ?)) AND payload IS NOT NULL'
+        )
+        params = (PENDING, FAILED, self.max_attempts, *PERMANENT_FAILURES, LEASED, now)
+        if sweep is not None:
+            runnable += ' AND sweep=?'
+            params += (sweep,)
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            first = self.conn.execute(f'SELECT identity FROM jobs WHERE {runnable} ORDER BY rowid LIMIT 1', params).fetchone()
+            if first is None:
+                self.conn.commit()
+                return []
+            rows = self.conn.execute(
+                f'SELECT rowid, identity, attribute, settings_hash, output_path, payload FROM jobs'
+                f' WHERE identity=? AND {runnable} ORDER BY rowid LIMIT ?',
+                (first[0], *params, limit),
+            ).fetchall()
+            self.conn.executemany(
+                'UPDATE jobs SET status=?, lease_owner=?, lease_expires=?, updated=? WHERE rowid=?',
+                [(LEASED, owner, now + lease_seconds, now, row[0]) for row in rows],
+            )
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        jobs = []
+        for _, identity, _, settings, output_path, payload in rows:
+            job = json.loads(payload)
+            job.update(identity=identity, settings=settings, output_path=output_path)
+            jobs.append(job)
+        return jobs
+
+    def summary(self):
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def failure_report(self):
+        # Failed jobs per failure kind, with the identity, attribute and error of each
+        report = {}
+        for identity, attribute, kind, attempts, error in self.conn.execute(
+                'SELECT identity, attribute, failure_kind, attempts, error FROM jobs WHERE status=? ORDER BY rowid',
+                (FAILED,)):
+            report.setdefault(kind or 'error', []).append(
+                {'identity': identity, 'attribute': attribute, 'attempts': attempts, 'error': error})
+        return report
@@ -0,0 +1,49 @@
+# Named memory profiles for the SDXL pipeline, from the fastest / largest to
+# the smallest footprint. `offload` is None to keep every model resident on
+# the device, 'model' to move whole models to the GPU only while they run and
+# 'sequential' to stream submodules layer by layer. `slicing` computes
+# attention in slices and decodes the VAE per image and in tiles. `device`
+# forces the engine device, e.g. a CPU-only run with small stand-in weights.
+MEMORY_PROFILES = {
+    'full': {'offload': None, 'slicing': False},
+    'sliced': {'offload': None, 'slicing': True},
+    'model-offload': {'offload': 'model', 'slicing': False},
+    'sequential-offload': {'offload': 'sequential', 'slicing': True},
+    'cpu': {'offload': None, 'slicing': False, 'device': 'cpu'},
+}
+
+# Next smaller profile to fall back to after running out of memory
+MEMORY_FALLBACK = {
+    'full': 'sliced',
+    'sliced': 'model-offload',
+    'model-offload': 'sequential-offload',
+}
+
+
+def profile_device(name, device):
+    return MEMORY_PROFILES[name].get('device', device)
+
+
+def load_with_profile(pipe, name, device, load_adapters):
+    # Place `pipe` according to the profile and call `load_adapters(pipe)`.
+    # Resident profiles move the pipeline first so adapter weights land on the
+    # device; offload profiles load adapters first so the offload hooks cover them.
+    profile = MEMORY_PROFILES[name]
+    device = profile.get('device', device)
+
+    if profile['offload'] is None:
+        pipe.to(device)
+        load_adapters(pipe)
+    else:
+        load_adapters(pipe)
+        gpu_id = getattr(device, 'index', None) or 0
+        if profile['offload'] == 'model':
+            pipe.enable_model_cpu_offload(gpu_id=gpu_id)
+        else:
+            pipe.enable_sequential_cpu_offload(gpu_id=gpu_id)
+
+    if profile['slicing']:
+        pipe.enable_attention_slicing()
+        pipe.enable_vae_slicing()
+        pipe.enable_vae_tiling()
+    return pipe
@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+from failures import NoFaceError
+
+def convert_from_image_to_cv2(img: Image) -> np.ndarray:
+    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+
+def resize_img(input_image, max_side=1280, min_side=1024, size=None, 
+               pad_to_max_side=False, mode=Image.BILINEAR, base_pixel_number=64):
+
+    w, h = input_image.size
+    if size is not None:
+        w_resize_new, h_resize_new = size
+    else:
+        # Same target as scaling to min_side, then to max_side, then flooring
+        # to a multiple of base_pixel_number, but resampled only once
+        ratio = min_side / min(h, w)
+        w, h = round(ratio*w), round(ratio*h)
+        ratio = max_side / max(h, w)
+        w_resize_new = (round(ratio * w) // base_pixel_number) * base_pixel_number
+        h_resize_new = (round(ratio * h) // base_pixel_number) * base_pixel_number
+    input_image = input_image.resize([w_resize_new, h_resize_new], mode)
+
+    if pad_to_max_side:
+        res = np.full([max_side, max_side, 3], 255, dtype=np.uint8)
+        offset_x = (max_side - w_resize_new) // 2
+        offset_y = (max_side - h_resize_new) // 2
+        res[offset_y:offset_y+h_resize_new, offset_x:offset_x+w_resize_new] = np.asarray(input_image)
+        input_image = Image.fromarray(res)
+    return input_image
+
+
+# SDXL training resolutions (width, height)
+SDXL_BUCKETS = [
+    (1024, 1024),
+    (1152, 896), (896, 1152),
+    (1216, 832), (832, 1216),
+    (1344, 768), (768, 1344),
+    (1536, 640), (640, 1536),
+]
+
+
+def nearest_bucket(size, buckets=SDXL_BUCKETS):
+    # Bucket whose aspect ratio is closest to that of `size`
+    w, h = size
+    return min(buckets, key=lambda b: abs(np.log((b[0] / b[1]) / (w / h))))
+
+
+def resize_to_bucket(input_image, buckets=SDXL_BUCKETS, mode=Image.BILINEAR):
+    # Center-crop to the bucket aspect ratio and resize in a single resample;
+    # returns the image and its bucket
+    bucket = nearest_bucket(input_image.size, buckets)
+    w, h = input_image.size
+    scale = max(bucket[0] / w, bucket[1] / h)
+    crop_w, crop_h = bucket[0] / scale, bucket[1] / scale
+    left, top = (w - crop_w) / 2, (h - crop_h) / 2
+    return input_image.resize(bucket, mode, box=(left, top, left + crop_w, top + crop_h)), bucket
+
+
+FACE_POLICIES = ('largest', 'central', 'det_score')
+
+
+def select_face(faces, policy='largest', image_size=None):
+    # Pick one insightface detection in a single pass: the largest bbox area,
+    # the bbox centre closest to the image centre (`image_size` = (w, h)) or
+    # the highest detection score
+    if len(faces) == 0:
+        raise NoFaceError('no face detected')
+    if len(faces) == 1:
+        return faces[0]
+
+    bboxes = np.asarray([face['bbox'] for face in faces], dtype=np.float32)
+    if policy == 'largest':
+        scores = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+    elif policy == 'central':
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+        scores = -np.hypot(*(centers - np.asarray(image_size, dtype=np.float32) / 2).T)
+    elif policy == 'det_score':
+        scores = np.asarray([face['det_score'] for face in faces], dtype=np.float32)
+    else:
+        raise ValueError(f"unknown face selection policy '{policy}', expected one of {FACE_POLICIES}")
+    return faces[int(np.argmax(scores))]
+
+
+KPS_COLORS = np.array([(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255)], dtype=np.uint8)
+KPS_LIMBS = ((0, 2), (1, 2), (3, 2), (4, 2))
+
+
+def draw_kps(size, kps, stickwidth=4, radius=10):
+    # Same rendering as the upstream InstantID draw_kps, but drawn straight
+    # into one uint8 canvas instead of copying a float64 canvas per primitive.
+    # `kps` is (5, 2) for one face or (n, 5, 2) to draw many faces at once.
+    w, h = size
+    kps = np.asarray(kps, dtype=np.float64).reshape(-1, 5, 2)
+    canvas = np.zeros([h, w, 3], dtype=np.uint8)
+
+    limb_colors = (KPS_COLORS * 0.6).astype(np.uint8)
+    for face in kps:
+        for start, end in KPS_LIMBS:
+            x, y = face[[start, end], 0], face[[start, end], 1]
+            length = np.hypot(x[0] - x[1], y[0] - y[1])
+            angle = np.degrees(np.arctan2(y[0] - y[1], x[0] - x[1]))
+            polygon = cv2.ellipse2Poly((int(np.mean(x)), int(np.mean(y))), (int(length / 2), stickwidth), int(angle), 0, 360, 1)
+            cv2.fillConvexPoly(canvas, polygon, limb_colors[start].tolist())
+
+    for face in kps:
+        for (x, y), color in zip(face, KPS_COLORS):
+            cv2.circle(canvas, (int(x), int(y)), radius, color.tolist(), -1)
+
+    return Image.fromarray(canvas)
+
+
+def render_control_mask(bbox, size, out=None):
+    # Single-channel uint8 face mask (255 inside the bbox). Pass `out` to
+    # reuse a preallocated (h, w) buffer for the same resolution.
+    w, h = size
+    if out is None:
+        out = np.zeros([h, w], dtype=np.uint8)
+    else:
+        out.fill(0)
+    x1, y1, x2, y2 = (int(v) for v in bbox[:4])
+    out[max(y1, 0):y2, max(x1, 0):x2] = 255
+    return out
+
+
+def mask_for_pipeline(mask):
+    # The InstantID pipeline reads channel 0 of an (h, w, 3) mask; expose the
+    # single-channel mask as a zero-copy broadcast view
+    return np.broadcast_to(mask[:, :, None], mask.shape + (3,))
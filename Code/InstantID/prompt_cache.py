@@ -0,0 +1,64 @@
+import os
+
+import torch
+
+
+class PromptEmbeddingCache:
+    # The prompt and negative prompt strings are fixed templates, so their SDXL
+    # text embeddings are encoded once per string and reused for every
+    # identity. Entries live on the pipeline device and can be persisted to
+    # `cache_file` (a torch.save'd dict) to skip text encoding across sweeps.
+    # `pipe` may also be a zero-argument callable returning the pipeline, so a
+    # lazily loaded pipeline is only resolved when it is needed.
+
+    def __init__(self, pipe, cache_file=None, model_id=None):
+        self._pipe = pipe
+        self.cache_file = cache_file
+        self.model_id = model_id
+        self._entries = {}
+        self._dirty = False
+
+        if cache_file is not None and os.path.exists(cache_file):
+            data = torch.load(cache_file, map_location='cpu')
+            if data.get('model_id') == model_id:
+                self._entries = data['entries']
+
+    @property
+    def pipe(self):
+        if callable(self._pipe) and not hasattr(self._pipe, 'encode_prompt'):
+            return self._pipe()
+        return self._pipe
+
+    def encode(self, text):
+        # Returns (prompt_embeds, pooled_prompt_embeds) for a single string
+        if text not in self._entries:
+            prompt_embeds, _, pooled_prompt_embeds, _ = self.pipe.encode_prompt(
+                prompt=text,
+                device=self.pipe._execution_device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False,
+            )
+            self._entries[text] = (prompt_embeds.cpu(), pooled_prompt_embeds.cpu())
+            self._dirty = True
+
+        prompt_embeds, pooled_prompt_embeds = self._entries[text]
+        device, dtype = self.pipe._execution_device, self.pipe.text_encoder_2.dtype
+        return prompt_embeds.to(device, dtype), pooled_prompt_embeds.to(device, dtype)
+
+    def batch(self, prompts, negative_prompts):
+        # Keyword arguments for the pipeline in place of prompt / negative_prompt
+        positive = [self.encode(text) for text in prompts]
+        negative = [self.encode(text) for text in negative_prompts]
+        return {
+            'prompt_embeds': torch.cat([embeds for embeds, _ in positive]),
+            'pooled_prompt_embeds': torch.cat([pooled for _, pooled in positive]),
+            'negative_prompt_embeds': torch.cat([embeds for embeds, _ in negative]),
+            'negative_pooled_prompt_embeds': torch.cat([pooled for _, pooled in negative]),
+        }
+
+    def save(self):
+        if self.cache_file is None or not self._dirty:
+            return
+        torch.save({'model_id': self.model_id, 'entries': self._entries}, self.cache_file + '.tmp')
+        os.replace(self.cache_file + '.tmp', self.cache_file)
+        self._dirty = False
@@ -0,0 +1,117 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+
+
+def component_bytes(component):
+    # Approximate resident size of a loaded component: parameters and buffers
+    # of torch modules (a diffusers pipeline's modules, a detector's `.model`)
+    # or the ONNX model files of an insightface FaceAnalysis
+    if isinstance(component, torch.nn.Module):
+        tensors = list(component.parameters()) + list(component.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if hasattr(component, 'components'):
+        return sum(component_bytes(module) for module in component.components.values()
+                   if isinstance(module, torch.nn.Module))
+    if isinstance(getattr(component, 'model', None), torch.nn.Module):
+        return component_bytes(component.model)
+    if hasattr(component, 'models'):
+        return sum(os.path.getsize(model.model_file) for model in component.models.values()
+                   if os.path.exists(getattr(model, 'model_file', '')))
+    return 0
+
+
+class ModelRegistry:
+    # Loads model components on first use and shares them between every engine,
+    # evaluation step or benchmark in the process that asks for the same key.
+    # With a `memory_budget` (bytes), the least recently used components are
+    # unloaded once the loaded total exceeds it. Loaders run outside the lock,
+    # so loading one component never blocks access to the others; concurrent
+    # requests for a key being loaded wait for that single load.
+
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._components = OrderedDict()  # key -> [component, size, last_used]
+        self._loading = {}  # key -> Future of a load in progress
+
+    def get(self, key, loader):
+        # Return the component stored under `key`, calling `loader()` to build it on a miss
+        with self._lock:
+            entry = self._components.get(key)
+            if entry is not None:
+                entry[2] = time.monotonic()
+                self._components.move_to_end(key)
+                return entry[0]
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+        if not owner:
+            return future.result()
+
+        start = time.perf_counter()
+        try:
+            component = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._components[key] = [component, component_bytes(component), time.monotonic()]
+            del self._loading[key]
+            print(f"Loaded {key[0] if isinstance(key, tuple) else key} in {time.perf_counter() - start:.1f}s")
+            self._enforce_budget(keep=key)
+        future.set_result(component)
+        return component
+
+    def loaded(self, key):
+        with self._lock:
+            return key in self._components
+
+    def unload(self, key):
+        with self._lock:
+            entry = self._components.pop(key, None)
+        if entry is not None:
+            del entry
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def unload_idle(self, max_idle_seconds):
+        # Unload every component not used in the last `max_idle_seconds`
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, (_, _, last_used) in self._components.items() if now - last_used > max_idle_seconds]
+        for key in idle:
+            self.unload(key)
+        return idle
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._components.keys())
+        for key in keys:
+            self.unload(key)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(size for _, size, _ in self._components.values())
+
+    def _enforce_budget(self, keep):
+        if self.memory_budget is None:
+            return
+        for key in list(self._components.keys()):
+            if self.total_bytes() <= self.memory_budget:
+                break
+            if key != keep:
+                self.unload(key)
+
+
+# Process-wide registry shared by default
+REGISTRY = ModelRegistry()
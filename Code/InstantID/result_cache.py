@@ -0,0 +1,43 @@
+import hashlib
+import os
+import shutil
+
+
+def job_seed(identity, attribute, base_seed=0):
+    # Stable per-(identity, attribute) seed, independent of job order and worker
+    digest = hashlib.sha256(f'{base_seed}:{identity}:{attribute}'.encode()).digest()
+    return int.from_bytes(digest[:4], 'little') & 0x7fffffff
+
+
+def result_key(source_hash, settings, pose_hash=None):
+    # `settings` is the job settings hash, which already covers the prompt,
+    # negative prompt, ControlNet / IP-Adapter scales, steps, guidance, seed,
+    # face policy, buckets, output mode and the model weights and dtype
+    return hashlib.sha1(f'{source_hash}:{pose_hash}:{settings}'.encode()).hexdigest()
+
+
+class ResultCache:
+    # Content-addressed store of generated images: identical requests are
+    # served by copying the stored file instead of re-running diffusion.
+
+    def __init__(self, cache_dir, ext='.jpg'):
+        self.cache_dir = cache_dir
+        self.ext = ext
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.ext)
+
+    def fetch(self, key, output_path):
+        # Copy a cached result to `output_path`; returns False on a miss
+        path = self.path(key)
+        if not os.path.exists(path):
+            return False
+        shutil.copyfile(path, output_path)
+        return True
+
+    def store(self, key, output_path):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(output_path, path + '.tmp')
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,206 @@
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import zlib
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from insightface.utils import face_align
+
+from attributes import ATTRIBUTE_GROUPS
+from conditioning import ConditioningCache
+from decode import OUTPUT_MODES
+from face_sink import ADAFACE_CKPT, open_face_sink
+from engine import (GENERATION_SETTINGS, BASE_MODEL_PATH, InstantIDEngine, controlnet_schedule, generation_config, job_config,
+                    model_dtype, model_stack, sweep_jobs)
+from manifest import Manifest, settings_hash
+from memory_profiles import MEMORY_PROFILES, profile_device
+from preprocess import FACE_POLICIES
+from prompt_cache import PromptEmbeddingCache
+from result_cache import ResultCache
+from schedulers import SCHEDULER_PRESETS
+
+
+class StandInEngine(InstantIDEngine):
+    # CPU stand-in with the engine's interface and no model weights, used to
+    # exercise the queue, leasing and worker plumbing end to end.
+
+    def __init__(self, device='cpu', max_batch_size=4, size=(64, 64), result_cache_dir=None, scheduler='default',
+                 output_mode='image', face_policy='largest', face_sink=None, seed=0, **kwargs):
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.size = size
+        self.base_model_path = 'stand-in'
+        self.settings = dict(GENERATION_SETTINGS, **SCHEDULER_PRESETS[scheduler]['settings'])
+        self.scheduler_preset = scheduler
+        self.output_mode = output_mode
+        self.face_policy = face_policy
+        self.buckets = None
+        self.model_stack = None
+        self.seed = seed
+        self.memory_profile = 'cpu'
+        self.face_sink = face_sink
+        self.conditioning_cache = ConditioningCache()
+        self.prompt_cache = PromptEmbeddingCache(None)
+        self.result_cache = ResultCache(result_cache_dir, OUTPUT_MODES[output_mode]) if result_cache_dir else None
+        self._init_io(prefetch=0, preprocess_workers=1)
+
+    def prepare(self, image_filename, pose_filename=None):
+        # Keypoints of the 112x112 alignment template scaled to the output, so
+        # the face sink path runs too
+        image = ImageOps.fit(Image.open(image_filename).convert('RGB'), self.size)
+        return {'image': image, 'kps': face_align.arcface_dst * (np.asarray(self.size) / 112)}
+
+    def output_kps(self, conditioning):
+        return conditioning['kps']
+
+    def generate_batch(self, conditioning, prompts, negative_prompts, seeds=None):
+        # Deterministic per-prompt tint plus seeded noise so outputs differ between jobs
+        base = np.asarray(conditioning['image'], dtype=np.uint8)
+        images = []
+        for k, (prompt, negative_prompt) in enumerate(zip(prompts, negative_prompts)):
+            shift = zlib.crc32(f"{prompt}\0{negative_prompt}".encode()) % 64
+            noise = np.random.default_rng(seeds[k] if seeds else 0).integers(0, 16, base.shape)
+            images.append(Image.fromarray((base // 2 + shift + noise).astype(np.uint8)))
+        if self.output_mode == 'latent':
+            return [np.asarray(image) for image in images]
+        return images
+
+
+ENGINES = {
+    'instantid': InstantIDEngine,
+    'stand-in': StandInEngine,
+}
+
+
+def sweep_id(settings, base_model_path=BASE_MODEL_PATH, base_seed=0, pose_filename=None):
+    # Everything job_settings hashes besides the prompt; jobs with the same
+    # sweep id are rendered identically by any worker of that sweep
+    return settings_hash({'settings': settings, 'base_model': base_model_path, 'seed': base_seed,
+                          'pose': pose_filename})
+
+
+def enqueue_sweep(manifest, groups=None, image_dir='./Images', output_dir='./Result', num_images=101,
+                  pose_filename=None, settings=None, base_model_path=BASE_MODEL_PATH, base_seed=0, output_ext='.jpg'):
+    # Returns the number of queued jobs and the sweep id the workers lease with
+    sweep = sweep_id(settings, base_model_path, base_seed, pose_filename)
+    queued = 0
+    for image_filename, jobs in sweep_jobs(groups, image_dir, output_dir, num_images, pose_filename,
+                                           settings, base_model_path, base_seed, output_ext):
+        for job in jobs:
+            payload = {
+                'image_filename': image_filename,
+                'pose_filename': pose_filename,
+                'prompt': job['prompt'],
+                'negative_prompt': job['negative_prompt'],
+                'seed': job['seed'],
+            }
+            queued += manifest.enqueue(job['identity'], job['attribute'], job['settings'], job['output_path'], payload,
+                                       sweep)
+    return queued, sweep
+
+
+def worker(engine_name, device, manifest_path, engine_kwargs, max_attempts, lease_seconds, sweep=None):
+    # One worker per device: build the engine once, then keep leasing batches
+    # of jobs of `sweep` for a single identity until the queue is drained
+    engine_kwargs = dict(engine_kwargs)
+    if engine_kwargs.get('face_sink'):
+        # Each worker writes its own shards (named by pid) into the shared sink directory
+        engine_kwargs['face_sink'] = open_face_sink(device=device, **engine_kwargs['face_sink'])
+    engine = ENGINES[engine_name](device=device, **engine_kwargs)
+    manifest = Manifest(manifest_path, max_attempts=max_attempts)
+    owner = f'{socket.gethostname()}:{os.getpid()}:{device}'
+
+    while True:
+        jobs = manifest.lease(owner, limit=engine.max_batch_size, lease_seconds=lease_seconds, sweep=sweep)
+        if not jobs:
+            break
+        engine.run_jobs(jobs[0]['image_filename'], jobs, jobs[0]['pose_filename'], manifest)
+
+    engine.flush_writes(manifest)
+    manifest.close()
+
+
+def run_workers(manifest_path, devices, engine_name='instantid', engine_kwargs=None, max_attempts=3,
+                lease_seconds=1800, sweep=None):
+    # CUDA cannot be re-initialised in forked children, so always spawn
+    ctx = mp.get_context('spawn')
+    processes = []
+    for device in devices:
+        process = ctx.Process(target=worker,
+                              args=(engine_name, device, manifest_path, engine_kwargs or {}, max_attempts, lease_seconds,
+                                    sweep))
+        process.start()
+        processes.append(process)
+
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Shard InstantID generation jobs across worker processes.')
+    parser.add_argument('--manifest', required=True, help='SQLite ledger used as the shared work queue')
+    parser.add_argument('--groups', nargs='+', choices=list(ATTRIBUTE_GROUPS.keys()), default=None)
+    parser.add_argument('--images', default='./Images')
+    parser.add_argument('--output', default='./Result')
+    parser.add_argument('--num-images', type=int, default=101)
+    parser.add_argument('--pose', default=None)
+    parser.add_argument('--devices', nargs='+', default=['cuda:0'], help='one worker per device, e.g. cuda:0 cuda:1 or cpu cpu')
+    parser.add_argument('--stand-in', action='store_true', help='use the weightless CPU stand-in engine')
+    parser.add_argument('--max-batch-size', type=int, default=4)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--lease-seconds', type=int, default=1800)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scheduler', choices=list(SCHEDULER_PRESETS.keys()), default='default')
+    parser.add_argument('--controlnet-scales', nargs=2, type=float, default=None, metavar=('IDENTITY', 'DEPTH'))
+    parser.add_argument('--control-window', nargs=2, type=float, default=None, metavar=('START', 'END'))
+    parser.add_argument('--memory-profile', choices=list(MEMORY_PROFILES.keys()), default='full')
+    parser.add_argument('--face-policy', choices=FACE_POLICIES, default='largest')
+    parser.add_argument('--output-mode', choices=list(OUTPUT_MODES.keys()), default='image')
+    parser.add_argument('--result-cache', default=None)
+    parser.add_argument('--face-sink', default=None, help='directory receiving aligned 112x112 faces of every output')
+    parser.add_argument('--adaface-dir', default=None, help='AdaFace checkout; adds embeddings to the face sink')
+    parser.add_argument('--adaface-ckpt', default=ADAFACE_CKPT)
+    args = parser.parse_args()
+    if args.face_sink and args.output_mode == 'latent':
+        parser.error("--face-sink needs decoded outputs, not --output-mode latent")
+
+    engine_name = 'stand-in' if args.stand_in else 'instantid'
+    settings, base_model_path = generation_config(args.scheduler), BASE_MODEL_PATH
+    controlnet_schedule(settings, args.controlnet_scales, args.control_window)
+    model = None
+    if args.stand_in:
+        base_model_path = 'stand-in'
+    else:
+        # Jobs are hashed once at enqueue time, so every worker must run the same precision
+        dtypes = {model_dtype(profile_device(args.memory_profile, device)) for device in args.devices}
+        if len(dtypes) > 1:
+            parser.error('--devices mixes CPU and CUDA workers, which generate at different precisions')
+        model = model_stack(dtype=dtypes.pop())
+    settings = job_config(settings, args.output_mode, args.face_policy, model=model)
+
+    manifest = Manifest(args.manifest, max_attempts=args.max_attempts)
+    queued, sweep = enqueue_sweep(manifest, args.groups, args.images, args.output, args.num_images, args.pose,
+                                  settings, base_model_path, args.seed, OUTPUT_MODES[args.output_mode])
+    print(f"Queued {queued} jobs")
+
+    engine_kwargs = {'max_batch_size': args.max_batch_size, 'scheduler': args.scheduler,
+                     'controlnet_scales': args.controlnet_scales, 'control_window': args.control_window,
+                     'memory_profile': args.memory_profile, 'output_mode': args.output_mode,
+                     'face_policy': args.face_policy, 'seed': args.seed}
+    if args.result_cache:
+        engine_kwargs['result_cache_dir'] = args.result_cache
+    if args.face_sink:
+        engine_kwargs['face_sink'] = {'sink_dir': args.face_sink, 'adaface_dir': args.adaface_dir,
+                                      'adaface_ckpt': args.adaface_ckpt}
+    run_workers(args.manifest, args.devices, engine_name, engine_kwargs,
+                args.max_attempts, args.lease_seconds, sweep)
+    print(manifest.summary())
+    for kind, failures in manifest.failure_report().items():
+        print(f"{kind}: {len(failures)} failed jobs, e.g. {failures[0]['identity']}/{failures[0]['attribute']}: "
+              f"{failures[0]['error']}")
+    manifest.close()
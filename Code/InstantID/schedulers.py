@@ -0,0 +1,50 @@
+from diffusers import DPMSolverMultistepScheduler, LCMScheduler
+
+# Named sampler presets. `settings` override the engine's generation settings;
+# `scheduler` is None to keep the scheduler the pipeline was loaded with.
+SCHEDULER_PRESETS = {
+    'default': {
+        'scheduler': None,
+        'settings': {'num_inference_steps': 30, 'guidance_scale': 5},
+    },
+    'dpmpp-2m': {
+        'scheduler': (DPMSolverMultistepScheduler, {'algorithm_type': 'dpmsolver++', 'use_karras_sigmas': True}),
+        'settings': {'num_inference_steps': 20, 'guidance_scale': 5},
+    },
+    'dpmpp-2m-fast': {
+        'scheduler': (DPMSolverMultistepScheduler, {'algorithm_type': 'dpmsolver++', 'use_karras_sigmas': True}),
+        'settings': {'num_inference_steps': 12, 'guidance_scale': 5},
+    },
+    'lcm': {
+        'scheduler': (LCMScheduler, {}),
+        'lora': 'latent-consistency/lcm-lora-sdxl',
+        'settings': {'num_inference_steps': 6, 'guidance_scale': 1.5},
+    },
+}
+
+
+def apply_scheduler_preset(pipe, name):
+    # Switch `pipe` to the preset's scheduler (and LoRA) and return its settings
+    preset = SCHEDULER_PRESETS[name]
+
+    if not hasattr(pipe, '_base_scheduler'):
+        pipe._base_scheduler = pipe.scheduler
+        pipe._scheduler_lora = None
+
+    if pipe._scheduler_lora is not None and pipe._scheduler_lora != preset.get('lora'):
+        pipe.unfuse_lora()
+        pipe.unload_lora_weights()
+        pipe._scheduler_lora = None
+
+    if preset['scheduler'] is None:
+        pipe.scheduler = pipe._base_scheduler
+    else:
+        scheduler_cls, config = preset['scheduler']
+        pipe.scheduler = scheduler_cls.from_config(pipe._base_scheduler.config, **config)
+
+    if preset.get('lora') and pipe._scheduler_lora != preset['lora']:
+        pipe.load_lora_weights(preset['lora'])
+        pipe.fuse_lora()
+        pipe._scheduler_lora = preset['lora']
+
+    return dict(preset['settings'])
@@ -69,9 +69,44 @@ USER: <image>\n<prompt>\nASSISTANT:
 from pathlib import Path
 import re
 
+"""Index the result folder once, parsing names like Code/t-SNE/result_index.py (copied here because the notebook runs standalone in Colab); each attribute below is read from the index instead of its own glob over the folder"""
+
+import os
+from collections import namedtuple
+
+ResultImage = namedtuple('ResultImage', ['identity', 'attribute', 'method', 'path'])
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# <id>_<attribute>, optionally prefixed with result_ as written by the InstantID engine
+NAME_PATTERN = re.compile(r'(?:result_)?(\d+)_(.+)')
+
+def scan_results(root, method=None):
+    # Walk `root` once with os.scandir and index every image by identity and attribute, sorted by path
+    method = method or Path(root).name
+    entries, folders = [], [str(root)]
+    while folders:
+        with os.scandir(folders.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                match = NAME_PATTERN.fullmatch(stem)
+                identity, attribute = match.groups() if match else (None, None)
+                entries.append(ResultImage(identity, attribute, method, Path(entry.path)))
+    return sorted(entries, key=lambda entry: str(entry.path))
+
+def images_with_suffix(suffix):
+    # Same files as images_path.glob("**/*" + suffix) and ResultIndex.suffix(suffix)
+    return [entry.path for entry in result_index if entry.path.name.endswith(suffix)]
+
 images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
+result_index = scan_results(images_path)
 
-images = [p for p in images_path.glob("**/*_young_skinmask.png")]
+images = images_with_suffix("_young_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -99,9 +134,7 @@ for img_path in images:
 accuracy_young = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_young, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_old_skinmask.png")]
+images = images_with_suffix("_old_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -129,9 +162,7 @@ for img_path in images:
 accuracy_old = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_old, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_male_skinmask.png")]
+images = images_with_suffix("_male_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -159,9 +190,7 @@ for img_path in images:
 accuracy_male = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_male, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_female_skinmask.png")]
+images = images_with_suffix("_female_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -189,9 +218,7 @@ for img_path in images:
 accuracy_female = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_female, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_bald.png")]
+images = images_with_suffix("_bald.png")
 
 correct_answers = 0
 total_images = 0
@@ -219,9 +246,7 @@ for img_path in images:
 accuracy_bald = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bald, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_black hair.png")]
+images = images_with_suffix("_black hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -249,9 +274,7 @@ for img_path in images:
 accuracy_black_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_black_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_brown hair.png")]
+images = images_with_suffix("_brown hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -279,9 +302,7 @@ for img_path in images:
 accuracy_brown_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_brown_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_blonde hair.png")]
+images = images_with_suffix("_blonde hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -309,9 +330,7 @@ for img_path in images:
 accuracy_blond_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_blond_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_bangs.png")]
+images = images_with_suffix("_bangs.png")
 
 correct_answers = 0
 total_images = 0
@@ -339,9 +358,7 @@ for img_path in images:
 accuracy_bangs = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bangs, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_bushy eyebrows_botheyebrowsmask.png")]
+images = images_with_suffix("_bushy eyebrows_botheyebrowsmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -369,9 +386,7 @@ for img_path in images:
 accuracy_bushy_eyebrows = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bushy_eyebrows, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_slightly open mouth_mouthmask.png")]
+images = images_with_suffix("_slightly open mouth_mouthmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -399,9 +414,7 @@ for img_path in images:
 accuracy_open_mouth = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_open_mouth, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_big nose_nosemask.png")]
+images = images_with_suffix("_big nose_nosemask.png")
 
 correct_answers = 0
 total_images = 0
@@ -429,9 +442,7 @@ for img_path in images:
 accuracy_big_nose = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_nose, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_big lips_bothlipsmask.png")]
+images = images_with_suffix("_big lips_bothlipsmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -459,9 +470,7 @@ for img_path in images:
 accuracy_big_lips = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_lips, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_eyeglasses_skinmask.png")]
+images = images_with_suffix("_eyeglasses_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -489,9 +498,7 @@ for img_path in images:
 accuracy_eyeglasses = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_eyeglasses, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_necktie_neckmask.png")]
+images = images_with_suffix("_necktie_neckmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -519,9 +526,7 @@ for img_path in images:
 accuracy_necktie = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_necktie, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_hat.png")]
+images = images_with_suffix("_hat.png")
 
 correct_answers = 0
 total_images = 0
@@ -549,9 +554,7 @@ for img_path in images:
 accuracy_hat = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_hat, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_DreamBooth")
-
-images = [p for p in images_path.glob("**/*_neutral expression_skinmask.png")]
+images = images_with_suffix("_neutral expression_skinmask.png")
 
 correct_answers = 0
 total_images = 0
@@ -69,9 +69,44 @@ USER: <image>\n<prompt>\nASSISTANT:
 from pathlib import Path
 import re
 
+"""Index the result folder once, parsing names like Code/t-SNE/result_index.py (copied here because the notebook runs standalone in Colab); each attribute below is read from the index instead of its own glob over the folder"""
+
+import os
+from collections import namedtuple
+
+ResultImage = namedtuple('ResultImage', ['identity', 'attribute', 'method', 'path'])
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# <id>_<attribute>, optionally prefixed with result_ as written by the InstantID engine
+NAME_PATTERN = re.compile(r'(?:result_)?(\d+)_(.+)')
+
+def scan_results(root, method=None):
+    # Walk `root` once with os.scandir and index every image by identity and attribute, sorted by path
+    method = method or Path(root).name
+    entries, folders = [], [str(root)]
+    while folders:
+        with os.scandir(folders.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                match = NAME_PATTERN.fullmatch(stem)
+                identity, attribute = match.groups() if match else (None, None)
+                entries.append(ResultImage(identity, attribute, method, Path(entry.path)))
+    return sorted(entries, key=lambda entry: str(entry.path))
+
+def images_with_suffix(suffix):
+    # Same files as images_path.glob("**/*" + suffix) and ResultIndex.suffix(suffix)
+    return [entry.path for entry in result_index if entry.path.name.endswith(suffix)]
+
 images_path = Path("/content/drive/MyDrive/Result_Inference")
+result_index = scan_results(images_path)
 
-images = [p for p in images_path.glob("**/*_smiling.png")]
+images = images_with_suffix("_smiling.png")
 
 correct_answers = 0
 total_images = 0
@@ -99,9 +134,7 @@ for img_path in images:
 accuracy_smiling = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_smiling, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_young.png")]
+images = images_with_suffix("_young.png")
 
 correct_answers = 0
 total_images = 0
@@ -129,9 +162,7 @@ for img_path in images:
 accuracy_young = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_young, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_old.png")]
+images = images_with_suffix("_old.png")
 
 correct_answers = 0
 total_images = 0
@@ -159,9 +190,7 @@ for img_path in images:
 accuracy_old = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_old, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_male.png")]
+images = images_with_suffix("_male.png")
 
 correct_answers = 0
 total_images = 0
@@ -189,9 +218,7 @@ for img_path in images:
 accuracy_male = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_male, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_female.png")]
+images = images_with_suffix("_female.png")
 
 correct_answers = 0
 total_images = 0
@@ -219,9 +246,7 @@ for img_path in images:
 accuracy_female = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_female, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_bald.png")]
+images = images_with_suffix("_bald.png")
 
 correct_answers = 0
 total_images = 0
@@ -249,9 +274,7 @@ for img_path in images:
 accuracy_bald = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bald, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_black hair.png")]
+images = images_with_suffix("_black hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -279,9 +302,7 @@ for img_path in images:
 accuracy_black_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_black_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_brown hair.png")]
+images = images_with_suffix("_brown hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -309,9 +330,7 @@ for img_path in images:
 accuracy_brown_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_brown_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_blond hair.png")]
+images = images_with_suffix("_blond hair.png")
 
 correct_answers = 0
 total_images = 0
@@ -339,9 +358,7 @@ for img_path in images:
 accuracy_blond_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_blond_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_bangs.png")]
+images = images_with_suffix("_bangs.png")
 
 correct_answers = 0
 total_images = 0
@@ -369,9 +386,7 @@ for img_path in images:
 accuracy_bangs = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bangs, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_no beard.png")]
+images = images_with_suffix("_no beard.png")
 
 correct_answers = 0
 total_images = 0
@@ -399,9 +414,7 @@ for img_path in images:
 accuracy_no_beard = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_no_beard, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_mustache.png")]
+images = images_with_suffix("_mustache.png")
 
 correct_answers = 0
 total_images = 0
@@ -429,9 +442,7 @@ for img_path in images:
 accuracy_mustache = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_mustache, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_bushy eyebrows.png")]
+images = images_with_suffix("_bushy eyebrows.png")
 
 correct_answers = 0
 total_images = 0
@@ -459,9 +470,7 @@ for img_path in images:
 accuracy_bushy_eyebrows = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bushy_eyebrows, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_slightly open mouth .png")]
+images = images_with_suffix("_slightly open mouth .png")
 
 correct_answers = 0
 total_images = 0
@@ -489,9 +498,7 @@ for img_path in images:
 accuracy_open_mouth = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_open_mouth, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_double chin.png")]
+images = images_with_suffix("_double chin.png")
 
 correct_answers = 0
 total_images = 0
@@ -519,9 +526,7 @@ for img_path in images:
 accuracy_double_chin = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_double_chin, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_big nose.png")]
+images = images_with_suffix("_big nose.png")
 
 correct_answers = 0
 total_images = 0
@@ -549,9 +554,7 @@ for img_path in images:
 accuracy_big_nose = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_nose, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_big lips.png")]
+images = images_with_suffix("_big lips.png")
 
 correct_answers = 0
 total_images = 0
@@ -579,9 +582,7 @@ for img_path in images:
 accuracy_big_lips = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_lips, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_eyeglasses.png")]
+images = images_with_suffix("_eyeglasses.png")
 
 correct_answers = 0
 total_images = 0
@@ -609,9 +610,7 @@ for img_path in images:
 accuracy_eyeglasses = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_eyeglasses, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_necktie.png")]
+images = images_with_suffix("_necktie.png")
 
 correct_answers = 0
 total_images = 0
@@ -639,9 +638,7 @@ for img_path in images:
 accuracy_necktie = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_necktie, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_hat.png")]
+images = images_with_suffix("_hat.png")
 
 correct_answers = 0
 total_images = 0
@@ -669,9 +666,7 @@ for img_path in images:
 accuracy_hat = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_hat, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_anger.png")]
+images = images_with_suffix("_anger.png")
 
 correct_answers = 0
 total_images = 0
@@ -699,9 +694,7 @@ for img_path in images:
 accuracy_angry = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_angry, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_neutral expression.png")]
+images = images_with_suffix("_neutral expression.png")
 
 correct_answers = 0
 total_images = 0
@@ -729,9 +722,7 @@ for img_path in images:
 accuracy_neutral_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_neutral_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_surprise expression.png")]
+images = images_with_suffix("_surprise expression.png")
 
 correct_answers = 0
 total_images = 0
@@ -759,9 +750,7 @@ for img_path in images:
 accuracy_surprise_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_surprise_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_sad expression.png")]
+images = images_with_suffix("_sad expression.png")
 
 correct_answers = 0
 total_images = 0
@@ -789,9 +778,7 @@ for img_path in images:
 accuracy_sad_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_sad_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_disgust expression.png")]
+images = images_with_suffix("_disgust expression.png")
 
 correct_answers = 0
 total_images = 0
@@ -819,9 +806,7 @@ for img_path in images:
 accuracy_disgusted_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_disgusted_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Inference")
-
-images = [p for p in images_path.glob("**/*_fear expression.png")]
+images = images_with_suffix("_fear expression.png")
 
 correct_answers = 0
 total_images = 0
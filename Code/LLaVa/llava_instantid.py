@@ -69,9 +69,44 @@ USER: <image>\n<prompt>\nASSISTANT:
 from pathlib import Path
 import re
 
+"""Index the result folder once, parsing names like Code/t-SNE/result_index.py (copied here because the notebook runs standalone in Colab); each attribute below is read from the index instead of its own glob over the folder"""
+
+import os
+from collections import namedtuple
+
+ResultImage = namedtuple('ResultImage', ['identity', 'attribute', 'method', 'path'])
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# <id>_<attribute>, optionally prefixed with result_ as written by the InstantID engine
+NAME_PATTERN = re.compile(r'(?:result_)?(\d+)_(.+)')
+
+def scan_results(root, method=None):
+    # Walk `root` once with os.scandir and index every image by identity and attribute, sorted by path
+    method = method or Path(root).name
+    entries, folders = [], [str(root)]
+    while folders:
+        with os.scandir(folders.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                match = NAME_PATTERN.fullmatch(stem)
+                identity, attribute = match.groups() if match else (None, None)
+                entries.append(ResultImage(identity, attribute, method, Path(entry.path)))
+    return sorted(entries, key=lambda entry: str(entry.path))
+
+def images_with_suffix(suffix):
+    # Same files as images_path.glob("**/*" + suffix) and ResultIndex.suffix(suffix)
+    return [entry.path for entry in result_index if entry.path.name.endswith(suffix)]
+
 images_path = Path("/content/drive/MyDrive/Result_Final")
+result_index = scan_results(images_path)
 
-images = [p for p in images_path.glob("**/*_smiling.jpg")]
+images = images_with_suffix("_smiling.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -99,9 +134,7 @@ for img_path in images:
 accuracy_smiling = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_smiling, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_young.jpg")]
+images = images_with_suffix("_young.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -129,9 +162,7 @@ for img_path in images:
 accuracy_young = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_young, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_old.jpg")]
+images = images_with_suffix("_old.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -159,9 +190,7 @@ for img_path in images:
 accuracy_old = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_old, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_male.jpg")]
+images = images_with_suffix("_male.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -189,9 +218,7 @@ for img_path in images:
 accuracy_male = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_male, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_female.jpg")]
+images = images_with_suffix("_female.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -219,9 +246,7 @@ for img_path in images:
 accuracy_female = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_female, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_bald.jpg")]
+images = images_with_suffix("_bald.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -249,9 +274,7 @@ for img_path in images:
 accuracy_bald = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bald, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_black hair.jpg")]
+images = images_with_suffix("_black hair.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -279,9 +302,7 @@ for img_path in images:
 accuracy_black_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_black_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_brown hair.jpg")]
+images = images_with_suffix("_brown hair.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -309,9 +330,7 @@ for img_path in images:
 accuracy_brown_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_brown_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_blond hair.jpg")]
+images = images_with_suffix("_blond hair.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -339,9 +358,7 @@ for img_path in images:
 accuracy_blond_hair = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_blond_hair, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_bangs.jpg")]
+images = images_with_suffix("_bangs.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -369,9 +386,7 @@ for img_path in images:
 accuracy_bangs = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bangs, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_no beard.jpg")]
+images = images_with_suffix("_no beard.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -399,9 +414,7 @@ for img_path in images:
 accuracy_no_beard = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_no_beard, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_mustache.jpg")]
+images = images_with_suffix("_mustache.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -429,9 +442,7 @@ for img_path in images:
 accuracy_mustache = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_mustache, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_bushy eyebrows.jpg")]
+images = images_with_suffix("_bushy eyebrows.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -459,9 +470,7 @@ for img_path in images:
 accuracy_bushy_eyebrows = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_bushy_eyebrows, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_slightly open mouth.jpg")]
+images = images_with_suffix("_slightly open mouth.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -489,9 +498,7 @@ for img_path in images:
 accuracy_open_mouth = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_open_mouth, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_double chin.jpg")]
+images = images_with_suffix("_double chin.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -519,9 +526,7 @@ for img_path in images:
 accuracy_double_chin = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_double_chin, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_big nose.jpg")]
+images = images_with_suffix("_big nose.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -549,9 +554,7 @@ for img_path in images:
 accuracy_big_nose = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_nose, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_big lips.jpg")]
+images = images_with_suffix("_big lips.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -579,9 +582,7 @@ for img_path in images:
 accuracy_big_lips = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_big_lips, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_eyeglasses.jpg")]
+images = images_with_suffix("_eyeglasses.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -609,9 +610,7 @@ for img_path in images:
 accuracy_eyeglasses = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_eyeglasses, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_necktie.jpg")]
+images = images_with_suffix("_necktie.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -639,9 +638,7 @@ for img_path in images:
 accuracy_necktie = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_necktie, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_hat.jpg")]
+images = images_with_suffix("_hat.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -669,9 +666,7 @@ for img_path in images:
 accuracy_hat = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_hat, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_angry.jpg")]
+images = images_with_suffix("_angry.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -699,9 +694,7 @@ for img_path in images:
 accuracy_angry = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_angry, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_neutral expression.jpg")]
+images = images_with_suffix("_neutral expression.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -729,9 +722,7 @@ for img_path in images:
 accuracy_neutral_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_neutral_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_surprise expression.jpg")]
+images = images_with_suffix("_surprise expression.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -759,9 +750,7 @@ for img_path in images:
 accuracy_surprise_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_surprise_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_sad expression.jpg")]
+images = images_with_suffix("_sad expression.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -789,9 +778,7 @@ for img_path in images:
 accuracy_sad_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_sad_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_disgust expression.jpg")]
+images = images_with_suffix("_disgust expression.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -819,9 +806,7 @@ for img_path in images:
 accuracy_disgusted_expression = (correct_answers / total_images) * 100
 print(f"Accuracy: {round(accuracy_disgusted_expression, 2)}%")
 
-images_path = Path("/content/drive/MyDrive/Result_Final")
-
-images = [p for p in images_path.glob("**/*_fear expression.jpg")]
+images = images_with_suffix("_fear expression.jpg")
 
 correct_answers = 0
 total_images = 0
@@ -0,0 +1,85 @@
+import hashlib
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+NO_FACE = 'no face detected'
+
+_cache_dir = None
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _init_worker(cache_dir):
+    # Each worker builds its own MTCNN detector (created when face_alignment.align
+    # is imported) and uses one thread so workers do not oversubscribe the CPU
+    global _cache_dir
+    import torch
+    torch.set_num_threads(1)
+    from face_alignment import align
+    _cache_dir = cache_dir
+
+
+def align_path(path, cache_dir=None):
+    # Aligned 112x112 RGB crop of `path` as a uint8 array, or None with the
+    # reason. Crops (and missing faces) are cached by image content.
+    from face_alignment import align
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, file_sha1(path))
+        if os.path.exists(cache_path + '.png'):
+            return np.array(Image.open(cache_path + '.png').convert('RGB')), None
+        if os.path.exists(cache_path + '.none'):
+            return None, NO_FACE
+
+    try:
+        crop = np.array(align.get_aligned_face(path))
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+    if crop.shape != (112, 112, 3):
+        crop, error = None, NO_FACE
+    else:
+        error = None
+
+    if cache_path is not None:
+        if crop is None:
+            open(cache_path + '.none', 'w').close()
+        else:
+            Image.fromarray(crop).save(cache_path + '.tmp.png')
+            os.replace(cache_path + '.tmp.png', cache_path + '.png')
+    return crop, error
+
+
+def _align_in_worker(path):
+    return align_path(path, _cache_dir)
+
+
+def align_images(paths, workers=2, cache_dir=None, chunksize=8):
+    # Yield (path, crop, error) for every path, in order, aligning `workers`
+    # images in parallel ahead of the consumer. `crop` is None when alignment
+    # failed and `error` says why.
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    if workers <= 0:
+        for path in paths:
+            yield (path, *align_path(path, cache_dir))
+        return
+
+    # spawn, so that a CUDA detector is never inherited through fork
+    ctx = mp.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(cache_dir,)) as pool:
+        for path, (crop, error) in zip(paths, pool.map(_align_in_worker, paths, chunksize=chunksize)):
+            yield path, crop, error
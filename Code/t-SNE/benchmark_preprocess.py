@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from embedding import to_input, to_input_batch
+
+
+def best_time(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_preprocess(batch_sizes=(1, 16, 64, 256), repeats=5, seed=0):
+    # Time the per-image to_input + torch.cat path against to_input_batch on
+    # random aligned crops, and check both give the same tensor
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in batch_sizes:
+        crops = rng.integers(0, 256, (n, 112, 112, 3), dtype=np.uint8)
+        images = [Image.fromarray(crop) for crop in crops]
+
+        per_image = best_time(lambda: torch.cat([to_input(image) for image in images]), repeats)
+        batched = best_time(lambda: to_input_batch(crops), repeats)
+        out = torch.empty((n, 3, 112, 112), dtype=torch.float32)
+        reused = best_time(lambda: to_input_batch(crops, out=out), repeats)
+
+        error = (torch.cat([to_input(image) for image in images]) - to_input_batch(crops)).abs().max().item()
+        rows.append({'batch_size': n, 'to_input_ms': per_image * 1e3, 'to_input_batch_ms': batched * 1e3,
+                     'to_input_batch_out_ms': reused * 1e3, 'max_abs_diff': error})
+        print(f"n={n:<4} to_input={per_image * 1e3:8.2f}ms to_input_batch={batched * 1e3:7.2f}ms "
+              f"(out= {reused * 1e3:6.2f}ms) speedup={per_image / batched:5.1f}x max_diff={error:.1e}")
+    return rows
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark to_input against to_input_batch.')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 16, 64, 256])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    benchmark_preprocess(args.batch_sizes, args.repeats)
@@ -0,0 +1,113 @@
+import os
+
+import net
+import numpy as np
+import torch
+
+from alignment import align_images
+
+
+# Define paths and model details
+adaface_models = {
+    'ir_50': "pretrained/adaface_ir50_ms1mv2.ckpt",
+}
+
+EMBEDDING_SIZE = 512
+
+
+def load_pretrained_model(architecture='ir_50'):
+    # Load model and pretrained state dictionary
+    assert architecture in adaface_models.keys(), "Architecture not found in the predefined models."
+    model = net.build_model(architecture)
+    statedict = torch.load(adaface_models[architecture], map_location=torch.device('cpu'))['state_dict']
+    model_statedict = {key[6:]: val for key, val in statedict.items() if key.startswith('model.')}
+    model.load_state_dict(model_statedict)
+    model.eval()
+    return model
+
+
+def to_input(pil_rgb_image):
+    # Preprocess image for model input
+    np_img = np.array(pil_rgb_image)
+    if np_img.shape != (112, 112, 3):
+        return None
+    brg_img = ((np_img[:, :, ::-1] / 255.) - 0.5) / 0.5
+    tensor = torch.tensor([brg_img.transpose(2, 0, 1)], dtype=torch.float)
+    return tensor
+
+
+def gallery_paths(orig_path):
+    # Every file in the identity folders of the biometric gallery
+    paths = []
+    if os.path.isdir(orig_path):
+        for image_name in os.listdir(orig_path):
+            image_folder_path = os.path.join(orig_path, image_name)
+            if not os.path.isdir(image_folder_path):
+                continue
+            for o in os.listdir(image_folder_path):
+                path = os.path.join(image_folder_path, o)
+                if os.path.isfile(path):
+                    paths.append(path)
+    return paths
+
+
+def to_input_batch(crops, out=None):
+    # Batched to_input: aligned RGB uint8 crops, an (N, 112, 112, 3) array or
+    # a list of (112, 112, 3) arrays, -> normalised BGR NCHW float32 tensor.
+    # The uint8 stack is wrapped without a copy, each channel is converted
+    # straight into its flipped slot of `out` (allocated if not given), and
+    # ((x / 255) - 0.5) / 0.5 is applied in place as x / 127.5 - 1.
+    faces = torch.from_numpy(crops if isinstance(crops, np.ndarray) else np.stack(crops))
+    n, h, w, _ = faces.shape
+    if out is None:
+        out = torch.empty((n, 3, h, w), dtype=torch.float32)
+    for c in range(3):
+        out[:, c].copy_(faces[..., 2 - c])
+    return out.div_(127.5).sub_(1.0)
+
+
+def embed_crops(model, crops, batch_size=64, device='cpu'):
+    # AdaFace features of already aligned (N, 112, 112, 3) RGB uint8 crops
+    model = model.to(device)
+    features = []
+    with torch.inference_mode():
+        for start in range(0, len(crops), batch_size):
+            feature, _ = model(to_input_batch(crops[start:start + batch_size]).to(device))
+            features.append(feature.float().cpu().numpy())
+    return np.concatenate(features) if features else np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+
+
+def embed_images(model, paths, batch_size=64, num_workers=2, device='cpu', return_paths=False, cache_dir=None,
+                 return_failures=False):
+    # AdaFace features of `paths` as an (N, 512) float32 matrix, in path order.
+    # Alignment runs in `num_workers` processes ahead of the model, with
+    # aligned crops optionally cached in `cache_dir`; images where no face is
+    # found are skipped, like the per-image loops did, and reported.
+    # `return_paths` adds the embedded paths and `return_failures` the
+    # (path, error) pairs of the skipped ones.
+    model = model.to(device)
+    features, kept, failures, batch = [], [], [], []
+
+    def run_batch():
+        feature, _ = model(to_input_batch([crop for _, crop in batch]).to(device))
+        features.append(feature.float().cpu().numpy())
+        kept.extend(path for path, _ in batch)
+        batch.clear()
+
+    with torch.inference_mode():
+        for path, crop, error in align_images(paths, num_workers, cache_dir):
+            if crop is None:
+                failures.append((path, error))
+                continue
+            batch.append((path, crop))
+            if len(batch) == batch_size:
+                run_batch()
+        if batch:
+            run_batch()
+
+    if failures:
+        print(f"Alignment failed for {len(failures)} of {len(paths)} images, e.g. {failures[0][0]}: {failures[0][1]}")
+    features = np.concatenate(features) if features else np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+    if not (return_paths or return_failures):
+        return features
+    return (features,) + ((kept,) if return_paths else ()) + ((failures,) if return_failures else ())
@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from alignment import NO_FACE, file_sha1
+from embedding import EMBEDDING_SIZE, embed_crops, embed_images
+
+
+class EmbeddingStore:
+    # On-disk cache of face embeddings for one model, keyed by image content.
+    # embeddings.npy is an (N, 512) float32 matrix opened memory-mapped;
+    # index.json maps each seen path to its mtime, size and sha1, and each
+    # sha1 to its row (-1 when no face was found). Unchanged files are served
+    # from the matrix without hashing; edited or new files are embedded once.
+    # Aligned crops are cached separately in `align_cache_dir`, so switching
+    # the embedding model does not repeat alignment.
+
+    def __init__(self, store_dir='./embeddings', model_id='adaface_ir_50', align_cache_dir=None):
+        self.model_id = model_id
+        self.align_cache_dir = align_cache_dir
+        self.store_dir = os.path.join(store_dir, model_id.replace('/', '_').replace(':', '_'))
+        self.matrix_path = os.path.join(self.store_dir, 'embeddings.npy')
+        self.index_path = os.path.join(self.store_dir, 'index.json')
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        self.files, self.rows = {}, {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get('model_id') == model_id:
+                self.files, self.rows = index['files'], index['rows']
+        self.matrix = (np.load(self.matrix_path, mmap_mode='r') if os.path.exists(self.matrix_path)
+                       else np.empty((0, EMBEDDING_SIZE), dtype=np.float32))
+
+    def sha1(self, path):
+        # Content hash of `path`, reusing the recorded one while mtime and size match
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.files.get(key)
+        if entry is None or entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+            entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': file_sha1(path)}
+            self.files[key] = entry
+        return entry['sha1']
+
+    def embed(self, model, paths, return_paths=False, **kwargs):
+        # Like embedding.embed_images, computing only images not in the store
+        digests = [self.sha1(path) for path in paths]
+        missing = {}
+        for path, digest in zip(paths, digests):
+            if digest not in self.rows:
+                missing.setdefault(digest, path)
+
+        if missing:
+            kwargs.setdefault('cache_dir', self.align_cache_dir)
+            features, kept, failures = embed_images(model, list(missing.values()), return_paths=True,
+                                                    return_failures=True, **kwargs)
+            digest_of = {path: digest for digest, path in missing.items()}
+            start = self.matrix.shape[0]
+            # Only a missing face is remembered; other alignment errors (I/O,
+            # a failed worker) are left out of the index and retried next time
+            for path, error in failures:
+                if error == NO_FACE:
+                    self.rows[digest_of[path]] = -1
+            for offset, path in enumerate(kept):
+                self.rows[digest_of[path]] = start + offset
+            self._append(features)
+        self._save_index()
+
+        selected = [(path, self.rows[digest]) for path, digest in zip(paths, digests) if self.rows.get(digest, -1) >= 0]
+        features = np.asarray(self.matrix[[row for _, row in selected]], dtype=np.float32).reshape(-1, EMBEDDING_SIZE)
+        return (features, [path for path, _ in selected]) if return_paths else features
+
+    def import_face_sink(self, sink_dir, model=None, **kwargs):
+        # Add outputs recorded by the InstantID engine's face sink (faces_*.npz
+        # shards of crops aligned on the conditioning keypoints) so that later
+        # embed() calls on them skip decoding and MTCNN alignment. Opt-in: the
+        # crops are aligned differently from MTCNN, so import into a separate
+        # store (e.g. model_id='adaface_ir_50_face_sink') and compare only runs
+        # imported the same way. Crops are embedded with `model`; without one
+        # the shard embeddings are used, which must come from the same model
+        # as the store. Returns the number of images added.
+        added = 0
+        for shard_path in sorted(glob.glob(os.path.join(sink_dir, 'faces_*.npz'))):
+            with np.load(shard_path) as shard:
+                new = {}
+                for k, path in enumerate(shard['output_path'].tolist()):
+                    if os.path.exists(path):
+                        digest = self.sha1(path)
+                        if digest not in self.rows:
+                            new.setdefault(digest, k)
+                if not new:
+                    continue
+                selected = list(new.values())
+                if model is not None:
+                    features = embed_crops(model, shard['faces'][selected], **kwargs)
+                elif 'embeddings' in shard.files:
+                    features = shard['embeddings'][selected]
+                else:
+                    raise ValueError(f'{shard_path} has no embeddings; pass the model to embed its faces')
+
+            start = self.matrix.shape[0]
+            for offset, digest in enumerate(new):
+                self.rows[digest] = start + offset
+            self._append(np.asarray(features, dtype=np.float32))
+            added += len(new)
+        self._save_index()
+        return added
+
+    def _append(self, features):
+        # Rewrite the matrix with `features` appended, then map it again
+        if len(features) == 0:
+            return
+        total = self.matrix.shape[0] + len(features)
+        tmp_path = self.matrix_path + '.tmp.npy'
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(total, EMBEDDING_SIZE))
+        matrix[:self.matrix.shape[0]] = self.matrix
+        matrix[self.matrix.shape[0]:] = features
+        matrix.flush()
+        del matrix
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
+
+    def _save_index(self):
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump({'model_id': self.model_id, 'files': self.files, 'rows': self.rows}, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
@@ -0,0 +1,60 @@
+import os
+import re
+from collections import namedtuple
+
+ResultImage = namedtuple('ResultImage', ['identity', 'attribute', 'method', 'path'])
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# <id>_<attribute>, optionally prefixed with result_ as written by the InstantID engine
+NAME_PATTERN = re.compile(r'(?:result_)?(\d+)_(.+)')
+
+
+class ResultIndex:
+    # In-memory index of the images under one or more result roots, answering
+    # attribute and filename-suffix queries without touching the disk again.
+    # Entries are sorted by path, i.e. by filename within a folder.
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry.path)
+        self._by_attribute = {}
+        for entry in self.entries:
+            self._by_attribute.setdefault(entry.attribute, []).append(entry)
+        self._by_suffix = {}
+
+    def __add__(self, other):
+        return ResultIndex(self.entries + other.entries)
+
+    def attribute(self, attribute, method=None):
+        return [entry for entry in self._by_attribute.get(attribute, []) if method is None or entry.method == method]
+
+    def suffix(self, suffix):
+        # Paths whose filename ends with `suffix`, e.g. "_black hair.png";
+        # the same files as glob("**/*" + suffix) or an endswith() filter
+        if suffix not in self._by_suffix:
+            self._by_suffix[suffix] = [entry.path for entry in self.entries
+                                       if os.path.basename(entry.path).endswith(suffix)]
+        return self._by_suffix[suffix]
+
+
+def scan_results(root, method=None, recursive=True):
+    # Walk `root` once with os.scandir and index every image; names of the form
+    # <id>_<attribute>.<ext> get their identity and attribute parsed. `method`
+    # defaults to the root folder name (e.g. Result_Blip).
+    method = method or os.path.basename(os.path.normpath(root))
+    entries = []
+    folders = [root]
+    while folders:
+        with os.scandir(folders.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    if recursive:
+                        folders.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                match = NAME_PATTERN.fullmatch(stem)
+                identity, attribute = match.groups() if match else (None, None)
+                entries.append(ResultImage(identity, attribute, method, entry.path))
+    return ResultIndex(entries)
@@ -1,7 +1,8 @@
-import net
 import torch
 import os
-from face_alignment import align
+from embedding import load_pretrained_model
+from embedding_store import EmbeddingStore
+from result_index import scan_results
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.manifold import TSNE
@@ -13,79 +14,22 @@ from sklearn import manifold
 from sklearn.utils import check_random_state
 
 
-# Define paths and model details
-adaface_models = {
-    'ir_50': "pretrained/adaface_ir50_ms1mv2.ckpt",
-}
-
-def load_pretrained_model(architecture='ir_50'):
-    # Load model and pretrained state dictionary
-    assert architecture in adaface_models.keys(), "Architecture not found in the predefined models."
-    model = net.build_model(architecture)
-    statedict = torch.load(adaface_models[architecture], map_location=torch.device('cpu'))['state_dict']
-    model_statedict = {key[6:]: val for key, val in statedict.items() if key.startswith('model.')}
-    model.load_state_dict(model_statedict)
-    model.eval()
-    return model
-
-def to_input(pil_rgb_image):
-    # Preprocess image for model input
-    np_img = np.array(pil_rgb_image)
-    if np_img.shape != (112, 112, 3):
-        return None
-    brg_img = ((np_img[:, :, ::-1] / 255.) - 0.5) / 0.5
-    tensor = torch.tensor([brg_img.transpose(2, 0, 1)], dtype=torch.float)
-    return tensor
-
 if __name__ == '__main__':
     model = load_pretrained_model('ir_50')
+    store = EmbeddingStore('./embeddings', align_cache_dir='./aligned')
 
     # Paths for images
     test_image_path = '/scratch/sgw6735/InstantID/Result_CNIP'
     
-    features_test1 = []
-    features_test2 = []
-    features_test3 = []
-
-    for fname in sorted(os.listdir(test_image_path)):
-        if fname.endswith(f"_black hair.png"):
-            path = os.path.join(test_image_path, fname)
-            if not os.path.exists(path):
-                continue
-            aligned_rgb_img = align.get_aligned_face(path)
-            bgr_tensor_input = to_input(aligned_rgb_img)
-            if bgr_tensor_input is None:
-                continue
-            feature, _ = model(bgr_tensor_input)
-            features_test1.append(feature.squeeze().detach().numpy())
-
-    for fname in sorted(os.listdir(test_image_path)):
-        if fname.endswith(f"_brown hair.png"):
-            path = os.path.join(test_image_path, fname)
-            if not os.path.exists(path):
-                continue
-            aligned_rgb_img = align.get_aligned_face(path)
-            bgr_tensor_input = to_input(aligned_rgb_img)
-            if bgr_tensor_input is None:
-                continue
-            feature, _ = model(bgr_tensor_input)
-            features_test2.append(feature.squeeze().detach().numpy())
+    results = scan_results(test_image_path, recursive=False)
 
-    for fname in sorted(os.listdir(test_image_path)):
-        if fname.endswith(f"_blonde hair.png"):
-            path = os.path.join(test_image_path, fname)
-            if not os.path.exists(path):
-                continue
-            aligned_rgb_img = align.get_aligned_face(path)
-            bgr_tensor_input = to_input(aligned_rgb_img)
-            if bgr_tensor_input is None:
-                continue
-            feature, _ = model(bgr_tensor_input)
-            features_test3.append(feature.squeeze().detach().numpy())
+    features_test1 = store.embed(model, results.suffix("_black hair.png"))
+    features_test2 = store.embed(model, results.suffix("_brown hair.png"))
+    features_test3 = store.embed(model, results.suffix("_blonde hair.png"))
 
-    M = np.stack(features_test1)
-    N = np.stack(features_test2)
-    P = np.stack(features_test3)
+    M = features_test1
+    N = features_test2
+    P = features_test3
     
     # Combine all the features
     arr = np.concatenate((M, N, P), axis=0)